@@ -1,6 +1,10 @@
+import atexit
+import os
 from flask import Flask
 from app.api.routes import api_bp
+from app.services.extraction import LocalAttributeExtractor
 from app.services.recommendation import FlexibleRecipeRecommendationSystem
+from app.utils.extraction_cache import ExtractionCache
 from config import Config
 
 def create_app(config_object=Config):
@@ -10,8 +14,32 @@ def create_app(config_object=Config):
     # Initialize the recommendation system with both CSV_FILE_PATH and PRECOMPUTED_DIR
     app.recommendation_system = FlexibleRecipeRecommendationSystem(
         app.config['CSV_FILE_PATH'],
-        app.config['PRECOMPUTED_DIR']
+        app.config['PRECOMPUTED_DIR'],
+        ann_n_probe=app.config['ANN_N_PROBE'],
+        image_cache_ttl=app.config['IMAGE_CACHE_TTL'],
+        image_cache_negative_ttl=app.config['IMAGE_CACHE_NEGATIVE_TTL'],
+        image_cache_lru_size=app.config['IMAGE_CACHE_LRU_SIZE'],
+        image_search_concurrency=app.config['IMAGE_SEARCH_CONCURRENCY'],
+        http_connector_options=app.config['HTTP_CONNECTOR_OPTIONS'],
+        http_host_limits=app.config['HTTP_HOST_LIMITS'],
+        batch_chunk_size=app.config['BATCH_CHUNK_SIZE'],
+        request_deadline=app.config['REQUEST_DEADLINE']
     )
+    app.extraction_cache = ExtractionCache(
+        os.path.join(app.config['PRECOMPUTED_DIR'], 'extraction_cache.sqlite'),
+        ttl=app.config['EXTRACTION_CACHE_TTL'],
+        lru_size=app.config['EXTRACTION_CACHE_LRU_SIZE']
+    )
+    data = app.recommendation_system.data
+    app.local_extractor = LocalAttributeExtractor.from_vectorizers(
+        data['tfidf_vectorizer_ingredients'],
+        data['tfidf_vectorizer_keywords'],
+        data['tfidf_vectorizer_keywords_name'],
+        min_confidence=app.config['EXTRACTION_FAST_PATH_MIN_CONFIDENCE']
+    )
+    # Flask has no shutdown hook; close the pooled session when the process exits
+    atexit.register(app.recommendation_system.close)
+    atexit.register(app.extraction_cache.close)
 
     app.register_blueprint(api_bp)
 
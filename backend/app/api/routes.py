@@ -1,9 +1,9 @@
 from flask import Blueprint, Response, request, jsonify, current_app
-from app.models.recipe import Recipe
 import json
 import asyncio
 from app.services import extraction
 from app.services import image_query 
+from app.utils.scrapers.base_scraper import BaseScraper
 
 api_bp = Blueprint('api', __name__)
 
@@ -13,43 +13,102 @@ def get_form_data():
         data = json.load(file)
     return jsonify(data)
 
+FEATURE_WEIGHTS_RECOMMEND = {
+    'ingredients': 0.15, 'category': 0.25, 'dietary': 0.20,
+    'calories': 0.10, 'time': 0.10, 'keywords': 0.10, 'keywords_name': 0.10
+}
+
+def parse_recommend_payload(data):
+    """
+    Turn a /recommend request body into get_recommendations query keywords.
+
+    Raises ValueError with a client-facing message for invalid input.
+    """
+    query = {
+        'category': data.get('category'),
+        'dietary_preference': data.get('dietary_preference'),
+        'ingredients': data.get('ingredients', []),
+        'calories': data.get('calories'),
+        'time': data.get('time'),
+        'keywords': data.get('keywords', []),
+        'keywords_name': data.get('keywords_name', []),
+    }
+
+    try:
+        if query['calories'] is not None:
+            query['calories'] = int(query['calories'])
+        if query['time'] is not None:
+            query['time'] = int(query['time'])
+    except ValueError:
+        raise ValueError("Calories and time must be integers if provided")
+
+    return query
+
 @api_bp.route('/recommend', methods=['POST'])
 async def recommend_recipes():  # Make this function async
     data = request.json
-    category = data.get('category')
-    dietary_preference = data.get('dietary_preference')
-    ingredients = data.get('ingredients', [])
-    calories = data.get('calories')
-    time = data.get('time')
-    keywords = data.get('keywords', [])
-    keywords_name = data.get('keywords_name', [])
+    search_mode = data.get('search_mode', 'exact')
 
-    try:
-        if calories is not None:
-            calories = int(calories)
-        if time is not None:
-            time = int(time)
-    except ValueError:
-        return jsonify({"error": "Calories and time must be integers if provided"}), 400
+    if search_mode not in ('exact', 'approximate'):
+        return jsonify({"error": "search_mode must be 'exact' or 'approximate'"}), 400
 
-    feature_weights_recommend = {
-        'ingredients': 0.15, 'category': 0.25, 'dietary': 0.20,
-        'calories': 0.10, 'time': 0.10, 'keywords': 0.10, 'keywords_name': 0.10
-    }
+    try:
+        query = parse_recommend_payload(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Use await to call the async function
     recommendations = await current_app.recommendation_system.get_recommendations(
-        category=category,
-        dietary_preference=dietary_preference,
-        ingredients=ingredients,
-        calories=calories,
-        time=time,
-        keywords=keywords,
-        keywords_name=keywords_name,
-        feature_weights=feature_weights_recommend
+        **query,
+        feature_weights=FEATURE_WEIGHTS_RECOMMEND,
+        search_mode=search_mode
     )
 
-    return jsonify([vars(recipe) for recipe in recommendations])
+    return Response(current_app.recommendation_system.to_json(recommendations), mimetype='application/json')
+
+@api_bp.route('/recommend/batch', methods=['POST'])
+async def recommend_recipes_batch():
+    data = request.json
+    if not isinstance(data, list) or not all(isinstance(payload, dict) for payload in data):
+        return jsonify({"error": "Expected a list of query payloads"}), 400
+    max_queries = current_app.config['BATCH_MAX_QUERIES']
+    if len(data) > max_queries:
+        return jsonify({"error": f"At most {max_queries} query payloads per batch"}), 400
+
+    try:
+        queries = [parse_recommend_payload(payload) for payload in data]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    recommendations = await current_app.recommendation_system.get_batch_recommendations(
+        queries,
+        feature_weights=FEATURE_WEIGHTS_RECOMMEND
+    )
+
+    recommendation_system = current_app.recommendation_system
+    body = b'[' + b','.join(recommendation_system.to_json(recipes) for recipes in recommendations) + b']'
+    return Response(body, mimetype='application/json')
+
+@api_bp.route('/image-cache/stats', methods=['GET'])
+def image_cache_stats():
+    return jsonify(dict(current_app.recommendation_system.image_cache.stats(),
+                        verification=BaseScraper.verification_cache.stats()))
+
+@api_bp.route('/extraction-cache/stats', methods=['GET'])
+def extraction_cache_stats():
+    llm_calls = extraction.llm_calls.stats()
+    return jsonify(dict(current_app.extraction_cache.stats(),
+                        llm_calls=llm_calls,
+                        image_llm_calls=image_query.llm_calls.stats(),
+                        fast_path=current_app.local_extractor.stats(llm_calls['mean_call_seconds'])))
+
+@api_bp.route('/image-sources/health', methods=['GET'])
+def image_source_health():
+    return jsonify(current_app.recommendation_system.image_search_service.source_stats())
+
+@api_bp.route('/outbound/stats', methods=['GET'])
+def outbound_stats():
+    return jsonify(current_app.recommendation_system.image_search_service.http_client.stats())
 
 @api_bp.route('/extract-recipe-attributes', methods=['POST'])
 async def recommend_recipes2():
@@ -62,8 +121,14 @@ async def recommend_recipes2():
         if not raw_text:
             return jsonify({"error": "No search text provided"}), 400
 
+        # One deadline covers the LLM call and the image lookups
+        deadline = current_app.recommendation_system.new_deadline()
+
         # Extract recipe attributes
-        extracted_info = extraction.extract_recipe_attributes(raw_text)  # Call the extraction function
+        # Runs off the event loop; identical concurrent texts share one model call
+        extracted_info = await extraction.extract_recipe_attributes_async(raw_text, deadline,
+                                                                          cache=current_app.extraction_cache,
+                                                                          local_extractor=current_app.local_extractor)
 
         # Check if extraction was successful
         if 'error' in extracted_info:
@@ -97,13 +162,13 @@ async def recommend_recipes2():
             time=time,
             keywords=keywords,
             keywords_name=keywords_name,
-            feature_weights=feature_weights_extract
+            feature_weights=feature_weights_extract,
+            deadline=deadline
         )
 
-        # Convert recommendations to JSON-serializable format
-        recipe_list = [vars(recipe) for recipe in recommendations]
-
-        return jsonify(recipe_list)
+        # Splice the cached per-recipe JSON fragments into the response
+        return Response(current_app.recommendation_system.to_json(recommendations),
+                        mimetype='application/json')
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -120,11 +185,16 @@ async def handle_analyze_food_image():
         if file.filename == '':
             return jsonify({"error": "No selected file"}), 400
         
+        # One deadline covers both LLM calls and the image lookups
+        deadline = current_app.recommendation_system.new_deadline()
+
         # Call the analyze function with the file
-        description = image_query.analyze_food_image(file)
+        description = await image_query.analyze_food_image_async(file, deadline)
         
         # Extract recipe attributes
-        extracted_info = extraction.extract_recipe_attributes(description)  # Call the extraction function
+        extracted_info = await extraction.extract_recipe_attributes_async(description, deadline,
+                                                                          cache=current_app.extraction_cache,
+                                                                          local_extractor=current_app.local_extractor)
 
         # Check if extraction was successful
         if 'error' in extracted_info:
@@ -158,13 +228,13 @@ async def handle_analyze_food_image():
             time=time,
             keywords=keywords,
             keywords_name=keywords_name,
-            feature_weights=feature_weights_extract
+            feature_weights=feature_weights_extract,
+            deadline=deadline
         )
 
-        # Convert recommendations to JSON-serializable format
-        recipe_list = [vars(recipe) for recipe in recommendations]
-
-        return jsonify(recipe_list)
+        # Splice the cached per-recipe JSON fragments into the response
+        return Response(current_app.recommendation_system.to_json(recommendations),
+                        mimetype='application/json')
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
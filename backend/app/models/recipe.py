@@ -17,4 +17,13 @@ class Recipe:
     RecipeIngredientQuantities: List[str]
     RecipeInstructions: List[str]
     Images: List[str]
-    Similarity: float  # Add this line if it's not already present
\ No newline at end of file
+    Similarity: float  # Add this line if it's not already present
+
+@dataclass
+class RecipeMatch:
+    """
+    A recommended recipe row plus the per-request fields of its Recipe.
+    """
+    row: int
+    Images: List[str]
+    Similarity: float
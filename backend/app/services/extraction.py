@@ -1,9 +1,17 @@
 import google.generativeai as genai
+import asyncio
+import copy
+import hashlib
 import json
-from difflib import get_close_matches
+import re
+import threading
 import os
 from dotenv import load_dotenv
-from difflib import SequenceMatcher
+from time import monotonic
+from app.utils.category_matcher import CategoryMatcher
+from app.utils.concurrency import BlockingCallPool, time_left
+from app.utils.extraction_cache import normalize_text
+from app.utils.keyword_rules import KeywordRules
 
 load_dotenv() 
 genai.configure(api_key=os.getenv("EXTRACTION_API_KEY"))
@@ -228,40 +236,27 @@ RECIPE_CATEGORIES = [
     "guatemalan"
 ]
 
+# Built once; find_closest_category used to rescan every category several times per call
+_category_matcher = CategoryMatcher(RECIPE_CATEGORIES)
+
+# Keyword augmentation for uncategorized inputs; edits to the file are picked up without a restart
+KEYWORD_RULES_PATH = os.getenv('KEYWORD_RULES_PATH', os.path.join(os.path.dirname(__file__), 'keyword_rules.json'))
+keyword_rules = KeywordRules(KEYWORD_RULES_PATH)
+
 def find_closest_category(category):
     """Find the closest matching category from the dataset."""
-    if not category:
-        return ""
-    
-    # First check for exact match
-    if category.lower() in [c.lower() for c in RECIPE_CATEGORIES]:
-        return next(c for c in RECIPE_CATEGORIES if c.lower() == category.lower())
-    
-    # For compound categories, check parts
-    category_parts = category.lower().split()
-    if len(category_parts) == 1 and category_parts[0] in [c.lower() for c in RECIPE_CATEGORIES]:
-        # If the input is a single word that exists in the category list, return it
-        return next(c for c in RECIPE_CATEGORIES if c.lower() == category_parts[0])
-    
-    for part in category_parts:
-        matches = [c for c in RECIPE_CATEGORIES if part in c.lower()]
-        if matches:
-            return matches[0]
-    
-    # If no matches found, use difflib to find closest match
-    matches = get_close_matches(category.lower(), [c.lower() for c in RECIPE_CATEGORIES], n=1, cutoff=0.75)
-    if matches:
-        closest_match = matches[0]
-        # Check if the closest match is close enough (similarity score > 0.8)
-        if SequenceMatcher(None, category.lower(), closest_match).ratio() > 0.8:
-            return next(c for c in RECIPE_CATEGORIES if c.lower() == closest_match)
-        else:
-            return ""
-    
-    # If no match is found at all, return empty string
-    return ""
+    return _category_matcher.match(category)
+
+MODEL_NAME = 'gemini-2.5-flash'
+GENERATION_CONFIG = {'temperature': 0, 'max_output_tokens': 150, 'top_p': 1}
+LLM_CALL_TIMEOUT = 20  # Seconds an async extraction may take when the caller has no deadline
+
+# Module level so tests can swap in a stub with the same generate_content method
+model = genai.GenerativeModel(MODEL_NAME)
+# Blocking model calls from async views run here, at most 8 at once
+llm_calls = BlockingCallPool(8, name='extraction-llm')
 
-def extract_recipe_attributes(text):
+def build_prompt(text):
     messages = [
         {"role": "system", "content": "You are an assistant that extracts recipe attributes from user input. If the input contains an uncommon or unrecognized category, add relevant general keywords based on common culinary types, such as 'beverages' for drinks, 'dessert' for sweets, etc."},
         {"role": "user", "content": f"""
@@ -350,149 +345,292 @@ Output:
 """}
     ]
 
-    # Send the prompt to OpenAI API
     prompt = ""
     for message in messages:
         if message["role"] == "system":
             prompt += message["content"] + "\n\n"
         else:
             prompt += message["content"]
+    return prompt
 
-    # Configure the Gemini model
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    # Generate response
-    response = model.generate_content(prompt, 
-                                     generation_config=genai.types.GenerationConfig(
-                                         temperature=0,
-                                         max_output_tokens=150,
-                                         top_p=1
-                                     ))
-    
-    # Process the response
-    output_text = response.text.strip()
-    
-    # Check if output is wrapped in markdown code blocks and extract the JSON if needed
-    if output_text.strip().startswith('```') and '```' in output_text:
-        import re
+# Identifies everything besides the input text that shapes the model output,
+# so cached extractions are not reused across prompt or model changes
+PROMPT_VERSION = hashlib.sha256(
+    json.dumps([build_prompt('{text}'), MODEL_NAME, GENERATION_CONFIG]).encode()
+).hexdigest()[:16]
+
+def parse_model_output(output_text):
+    """
+    Parse the model's JSON reply, unwrapping a markdown code block if present.
+    Raises json.JSONDecodeError if it is not valid JSON.
+    """
+    output_text = output_text.strip()
+    if output_text.startswith('```'):
         match = re.search(r'```(?:json)?\n(.*?)\n```', output_text, re.DOTALL)
         if match:
             output_text = match.group(1).strip()
-    
-    try:
-        result = json.loads(output_text)
-        # Update category with closest match from dataset
-        original_category = result["category"]
-        matched_category = find_closest_category(original_category)
-        
-        if matched_category:
-            result["category"] = matched_category
-            if original_category != matched_category:
-                result["keywords_name"] = matched_category.split()
+    return json.loads(output_text)
+
+def postprocess_attributes(result, text):
+    """
+    Map the extracted category onto the dataset's categories, adding
+    keywords and ingredients from the input text when none matches.
+    """
+    # Update category with closest match from dataset
+    original_category = result["category"]
+    matched_category = find_closest_category(original_category)
+
+    if matched_category:
+        result["category"] = matched_category
+        if original_category != matched_category:
+            result["keywords_name"] = matched_category.split()
+    else:
+        result["category"] = ""
+        # Add additional context-based keywords and ingredients if category is empty
+        keyword_rules.apply(result, text)
+
+    return result
+
+_CALORIE_UNITS = r'(?:k?cals?|kilocalories|calories)\b'
+_TIME_UNITS = r'(minutes?|mins?|hours?|hrs?)\b'
+# Numbers start at a digit-group boundary, so "1,500 calories" is never read as 500 nor "1/2 hour" as 2
+_CALORIES_RE = re.compile(r'(?<![\d.,/])(\d{1,3}(?:,\d{3})+|\d+)\s*' + _CALORIE_UNITS)
+_TIME_RE = re.compile(r'(?<![\d.,/])(\d+(?:\.\d+)?)\s*' + _TIME_UNITS)
+# A number or range start just before a limit ("1 500 calories", "30-45 minutes") makes its value ambiguous
+_NUMBER_BEFORE_RE = re.compile(r'\d[\d.,]*\s*(?:[-\u2013]\s*|to\s+)?$')
+# So does a fraction or mixed number ("1/2 hour", "2 1/2 hours"), which the limit regexes never match
+_FRACTION_LIMIT_RE = re.compile(r'\d+\s*/\s*\d+\s*(?:' + _CALORIE_UNITS + '|' + _TIME_UNITS + ')')
+_ITEM_SEPARATOR_RE = re.compile(r'[,;&+\n]|\band\b|\bwith\b|\bor\b')
+_WORD_RE = re.compile(r'[a-z]+')
+# Words that carry no recipe attribute in requests like "what can I make with ..."
+_FILLER_WORDS = frozenset("""
+    a an the i im me my we you some any something anything have has got what which can could
+    make made making cook cooking prepare in within under less than about around approx approximately
+    only just please give show find want wish would like need looking for to of that is are it
+    there using use involving containing contains recipe recipes dish dishes food meal meals
+""".split())
+
+class LocalAttributeExtractor:
+    """
+    Rule-based attribute extraction for simple queries, so they skip the LLM.
+
+    Handles plain ingredient lists ("basil, tomato and clove"), a bare
+    category ("dessert"), and either with a time or calorie limit ("chicken
+    in 30 minutes", "200 calories"). Words are recognized with the dataset
+    categories and the fitted TF-IDF vocabularies; numbers with units are
+    read with regular expressions.
+
+    extract() returns the attribute dict the LLM path would, after the same
+    post-processing, with a confidence in [0, 1]: the share of content words
+    recognized (dish names count half), halved when the query is not one of
+    the shapes above, and 0 when a limit's value is ambiguous ("1 500
+    calories", "30-45 minutes", "1/2 hour") and so left to the LLM. Only a
+    bare category sets category; a category word in a list is an item.
+    try_extract() returns it only when the confidence reaches
+    min_confidence, counting fast-path and fallback queries for stats().
+    """
+    def __init__(self, ingredient_vocabulary, keyword_vocabulary, name_vocabulary, min_confidence=0.85):
+        self.ingredient_vocabulary = frozenset(ingredient_vocabulary)
+        self.keyword_vocabulary = frozenset(keyword_vocabulary)
+        self.name_vocabulary = frozenset(name_vocabulary)
+        self.min_confidence = min_confidence
+        self.categories = _category_matcher.exact
+        self._lock = threading.Lock()
+        self.counters = {'queries': 0, 'fast_path': 0, 'fallback': 0, 'fast_path_seconds': 0.0}
+
+    @classmethod
+    def from_vectorizers(cls, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                         tfidf_vectorizer_keywords_name, **kwargs):
+        return cls(tfidf_vectorizer_ingredients.vocabulary_, tfidf_vectorizer_keywords.vocabulary_,
+                   tfidf_vectorizer_keywords_name.vocabulary_, **kwargs)
+
+    def _known(self, term, vocabulary):
+        """
+        Return term, or its singular, if vocabulary has it (for phrases, every word); else None.
+        """
+        for candidate in (term, term[:-2] if term.endswith('es') else None, term[:-1] if term.endswith('s') else None):
+            if candidate and (candidate in vocabulary or all(word in vocabulary for word in candidate.split())):
+                return candidate
+        return None
+
+    def extract(self, text):
+        lowered = text.casefold()
+        result = {"category": "", "calories": "", "time": "", "ingredients": [], "keywords": [], "keywords_name": []}
+
+        calories_match = _CALORIES_RE.search(lowered)
+        if calories_match:
+            result["calories"] = calories_match.group(1).replace(',', '')
+            result["keywords"].append(calories_match.group(0))
+        time_match = _TIME_RE.search(lowered)
+        if time_match:
+            minutes = float(time_match.group(1)) * (60 if time_match.group(2).startswith('h') else 1)
+            result["time"] = str(int(round(minutes)))
+            result["keywords"].append(time_match.group(0))
+        limit_matches = [match for match in (calories_match, time_match) if match]
+        ambiguous_limit = (any(_NUMBER_BEFORE_RE.search(lowered, 0, match.start()) for match in limit_matches)
+                           or bool(_FRACTION_LIMIT_RE.search(lowered)))
+        # Cut the matched limits out, last first so the earlier span's offsets stay valid
+        for match in sorted(limit_matches, key=lambda match: -match.start()):
+            lowered = lowered[:match.start()] + ',' + lowered[match.end():]
+
+        # A bare category may itself contain separators ("lunch/snacks", "chicken thigh & leg"),
+        # or come with filler around it ("chicken in 30 minutes", "dessert recipes")
+        whole = ' '.join(lowered.strip(' ,.!?').split())
+        if whole not in self.categories:
+            whole = ' '.join(word for word in _WORD_RE.findall(whole) if word not in _FILLER_WORDS)
+        # Only a bare category sets the category; in a list ("chicken, rice") it is just an item
+        category = self.categories.get(whole, "")
+        items = [whole] if category else _ITEM_SEPARATOR_RE.split(lowered)
+
+        content_words = known_words = 0
+        seen = set()
+        for item in items:
+            if category:
+                words = whole.split()
+            else:
+                words = [word for word in _WORD_RE.findall(item) if word not in _FILLER_WORDS]
+            phrase = ' '.join(words)
+            if not words or phrase in seen:
+                continue
+            seen.add(phrase)
+            content_words += len(words)
+
+            ingredient = self._known(phrase, self.ingredient_vocabulary)
+            if category:
+                if ingredient:
+                    result["ingredients"].append(ingredient)
+                known_words += len(words)
+            elif ingredient:
+                result["ingredients"].append(ingredient)
+                if self._known(phrase, self.keyword_vocabulary):
+                    result["keywords"].append(ingredient)
+                known_words += len(words)
+            elif self._known(phrase, self.keyword_vocabulary):
+                result["keywords"].append(phrase)
+                known_words += len(words)
+            elif self._known(phrase, self.name_vocabulary):
+                # A dish name is better understood by the LLM, so it only half counts
+                result["keywords_name"].append(phrase)
+                known_words += len(words) / 2
+
+        has_limit = bool(result["calories"] or result["time"])
+        if content_words == 0:
+            confidence = 1.0 if has_limit else 0.0
         else:
-            result["category"] = ""
-            # Add additional context-based keywords and ingredients if category is empty
-            if "coffee" in text.lower() or "latte" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["coffee", "beverages", "caffeinated", "hot drink"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "caffeinated", "coffee"]
-                result["ingredients"] = result.get("ingredients", []) + ["coffee beans", "water"]
-                
-            elif "smoothie bowl" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "healthy", "smoothie bowl"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "smoothie bowl"]
-                result["ingredients"] = result.get("ingredients", []) + ["fruits", "yogurt", "granola"]
-                
-            elif "kombucha" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverage", "fermented", "kombucha"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "kombucha"]
-                result["ingredients"] = result.get("ingredients", []) + ["tea", "sugar", "SCOBY"]
-
-            elif "herbal tea" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "caffeine-free", "herbal tea"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "herbal tea"]
-                result["ingredients"] = result.get("ingredients", []) + ["herbs", "water"]
-
-            elif "seaweed" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["ingredient", "seafood", "seaweed"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["seaweed"]
-                result["ingredients"] = result.get("ingredients", []) + ["seaweed"]
-
-            elif "vegan cheese" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["dairy-free", "vegan", "cheese"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["vegan cheese"]
-                result["ingredients"] = result.get("ingredients", []) + ["cashews", "nutritional yeast", "coconut oil"]
-
-            elif "air fryer" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["cooking method", "air fryer", "healthy"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["air fryer"]
-                result["ingredients"] = result.get("ingredients", [])  # Ingredients vary with recipe, left blank
-
-            elif "instant pot" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["cooking method", "instant pot", "pressure cooker"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["instant pot"]
-                result["ingredients"] = result.get("ingredients", [])  # Ingredients vary with recipe, left blank
-
-            elif "sous vide" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["cooking method", "sous vide", "precision cooking"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["sous vide"]
-                result["ingredients"] = result.get("ingredients", [])  # Ingredients vary with recipe, left blank
-
-            elif "paleo" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["diet", "paleo", "low-carb"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["paleo"]
-                result["ingredients"] = result.get("ingredients", [])  # Ingredients vary with recipe, left blank
-
-            elif "fodmap" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["diet", "fodmap", "digestive health"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["fodmap"]
-                result["ingredients"] = result.get("ingredients", [])  # Ingredients vary with recipe, left blank
-
-            elif "cold brew" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "caffeinated", "cold coffee"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "cold brew"]
-                result["ingredients"] = result.get("ingredients", []) + ["coffee grounds", "water"]
-
-            elif "matcha" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "green tea", "matcha"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "matcha"]
-                result["ingredients"] = result.get("ingredients", []) + ["matcha powder", "water", "milk"]
-
-            elif "smoothie" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "healthy", "smoothie"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "smoothie"]
-                result["ingredients"] = result.get("ingredients", []) + ["fruits", "milk", "yogurt"]
-
-            elif "protein shake" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverages", "high protein", "shake"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["beverages", "protein shake"]
-                result["ingredients"] = result.get("ingredients", []) + ["protein powder", "milk", "banana"]
-
-            elif "oat milk" in text.lower() or "almond milk" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["dairy-free", "vegan", "plant-based milk"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["oat milk" if "oat" in text.lower() else "almond milk"]
-                result["ingredients"] = result.get("ingredients", []) + ["oats" if "oat" in text.lower() else "almonds", "water"]
-
-            elif "zoodles" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["low carb", "gluten-free", "vegetable noodles", "noodles"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["zoodles", "noodles"]
-                result["ingredients"] = result.get("ingredients", []) + ["zucchini"]
-
-            elif "avocado toast" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["breakfast", "healthy", "avocado"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["avocado toast"]
-                result["ingredients"] = result.get("ingredients", []) + ["avocado", "bread"]
-
-            elif "golden milk" in text.lower():
-                result["keywords"] = result.get("keywords", []) + ["beverage", "turmeric", "anti-inflammatory"]
-                result["keywords_name"] = result.get("keywords_name", []) + ["golden milk"]
-                result["ingredients"] = result.get("ingredients", []) + ["turmeric", "milk", "honey", "spices"]
-            # other cases...
-            
+            coverage = known_words / content_words
+            ingredient_list = len(result["ingredients"]) >= 2 or (result["ingredients"] and has_limit)
+            confidence = coverage if category or ingredient_list else coverage / 2
+        if ambiguous_limit:
+            confidence = 0.0
+
+        if category:
+            result["category"] = category
+            result["keywords"].insert(0, category)
+            result["keywords_name"] = category.split() + result["keywords_name"]
+        return postprocess_attributes(result, text), confidence
+
+    def try_extract(self, text):
+        """
+        Return the local extraction of text if it is confident enough, else None.
+        """
+        started = monotonic()
+        result, confidence = self.extract(text)
+        accepted = confidence >= self.min_confidence
+        with self._lock:
+            self.counters['queries'] += 1
+            if accepted:
+                self.counters['fast_path'] += 1
+                self.counters['fast_path_seconds'] += monotonic() - started
+            else:
+                self.counters['fallback'] += 1
+        return result if accepted else None
+
+    def stats(self, llm_call_seconds=None):
+        """
+        Share of queries answered locally and, given the mean LLM call time,
+        the latency the fast path saved.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+        fast_path_seconds = stats.pop('fast_path_seconds')
+        stats['fast_path_share'] = stats['fast_path'] / stats['queries'] if stats['queries'] else 0.0
+        stats['mean_fast_path_ms'] = fast_path_seconds / stats['fast_path'] * 1000 if stats['fast_path'] else None
+        if llm_call_seconds is not None and stats['fast_path']:
+            saved = llm_call_seconds - fast_path_seconds / stats['fast_path']
+            stats['saved_seconds_per_fast_path_query'] = saved
+            stats['saved_seconds_total'] = saved * stats['fast_path']
+        return stats
+
+def generate_attributes_text(text, deadline=None):
+    """
+    Send the extraction prompt for text to the model and return its raw reply.
+    Blocks for the whole round trip; deadline (a time.monotonic() value) bounds it.
+    """
+    request_options = {'timeout': time_left(deadline)} if deadline is not None else None
+    response = model.generate_content(build_prompt(text),
+                                      generation_config=genai.types.GenerationConfig(**GENERATION_CONFIG),
+                                      request_options=request_options)
+    return response.text.strip()
+
+def _finish_extraction(text, output_text, cache, cache_key):
+    try:
+        parsed = parse_model_output(output_text)
     except json.JSONDecodeError:
-        result = {"error": "Failed to parse JSON", "output": output_text}
-    
+        return {"error": "Failed to parse JSON", "output": output_text}
+
+    result = postprocess_attributes(copy.deepcopy(parsed), text)
+    # Stored only once the output has parsed and post-processed cleanly
+    if cache is not None:
+        cache.set(PROMPT_VERSION, cache_key, parsed)
     return result
 
+def extract_recipe_attributes(text, deadline=None, cache=None, local_extractor=None):
+    """
+    Extract recipe attributes from free text with the LLM.
+
+    deadline is an optional time.monotonic() value bounding the API call.
+    cache is an optional ExtractionCache; parsed model output is looked up
+    and stored by normalized text, so only inputs not seen recently reach
+    the API, and failed parses are never stored. local_extractor is an
+    optional LocalAttributeExtractor answering simple queries without it.
+    """
+    local_result = local_extractor.try_extract(text) if local_extractor is not None else None
+    if local_result is not None:
+        return local_result
+
+    cache_key = normalize_text(text)
+    parsed = cache.get(PROMPT_VERSION, cache_key) if cache is not None else None
+    if parsed is not None:
+        return postprocess_attributes(parsed, text)
+
+    return _finish_extraction(text, generate_attributes_text(text, deadline), cache, cache_key)
+
+async def extract_recipe_attributes_async(text, deadline=None, cache=None, local_extractor=None):
+    """
+    extract_recipe_attributes for async views.
+
+    The model call runs on llm_calls instead of the event loop, and
+    concurrent requests whose text normalizes the same share one call. The
+    call is bounded by deadline, or LLM_CALL_TIMEOUT without one; on timeout
+    an error dict is returned.
+    """
+    local_result = local_extractor.try_extract(text) if local_extractor is not None else None
+    if local_result is not None:
+        return local_result
+
+    cache_key = normalize_text(text)
+    parsed = cache.get(PROMPT_VERSION, cache_key) if cache is not None else None
+    if parsed is not None:
+        return postprocess_attributes(parsed, text)
+
+    timeout = time_left(deadline, LLM_CALL_TIMEOUT)
+    try:
+        output_text = await llm_calls.run((PROMPT_VERSION, cache_key), generate_attributes_text,
+                                          text, monotonic() + timeout, timeout=timeout)
+    except asyncio.TimeoutError:
+        return {"error": "Attribute extraction timed out"}
+    return _finish_extraction(text, output_text, cache, cache_key)
+
 # Example usage:
 if __name__ == '__main__':
     test_cases = [
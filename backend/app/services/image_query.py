@@ -1,12 +1,19 @@
 from flask import Flask, request, jsonify
 import google.generativeai as genai
 import PIL.Image
+import asyncio
+import hashlib
 import io
+import logging
 import os
 from dotenv import load_dotenv
+from time import monotonic
+from app.utils.concurrency import BlockingCallPool, time_left
 app = Flask(__name__)
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configure Gemini API - get key from https://makersuite.google.com/app/apikey
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 genai.configure(api_key=GOOGLE_API_KEY)
@@ -14,37 +21,67 @@ genai.configure(api_key=GOOGLE_API_KEY)
 # Initialize the model - UPDATED MODEL NAME HERE
 model = genai.GenerativeModel('gemini-2.5-flash')  
 
-def analyze_food_image(image_content) -> str:
-    """
-    Analyze image using Gemini API and return food description
-    """
-    try:
-        prompt = """
+PROMPT = """
         Look at this food image and:
         1. Identify the main dish/food item
         2. List visible ingredients or components, including individual words/strings of the main dish
         3. Return ONLY a simple description in this format: [main dish], [ingredients]
         For example: "pizza, pizza, cheese, tomatoes, basil" or "chocolate cake, chocolate, cake, frosting, berries"
         """
-        
-        # Convert bytes to PIL Image
-        image_bytes = image_content.read()
-        image = PIL.Image.open(io.BytesIO(image_bytes))
-        
-        # Generate response
-        response = model.generate_content([prompt, image])
-        
-        # Clean and format the response
-        description = response.text.strip().lower()
-        description = description.replace('"', '').replace("'", '')
+LLM_CALL_TIMEOUT = 20  # Seconds an async analysis may take when the caller has no deadline
+
+# Blocking model calls from async views run here, at most 4 at once
+llm_calls = BlockingCallPool(4, name='image-query-llm')
+
+def describe_image(image_bytes, deadline=None) -> str:
+    """
+    Ask the model for a description of the food in an image; blocks for the round trip.
+    """
+    # Convert bytes to PIL Image
+    image = PIL.Image.open(io.BytesIO(image_bytes))
+
+    # Generate response
+    request_options = {'timeout': time_left(deadline)} if deadline is not None else None
+    response = model.generate_content([PROMPT, image], request_options=request_options)
 
-        print(description) # For testing purpose
+    # Clean and format the response
+    description = response.text.strip().lower()
+    description = description.replace('"', '').replace("'", '')
 
-        return description if description else "food dish"
+    logger.info(f"Image description: {description}")
+
+    return description if description else "food dish"
+
+def analyze_food_image(image_content, deadline=None) -> str:
+    """
+    Analyze image using Gemini API and return food description.
+    deadline is an optional time.monotonic() value bounding the API call.
+    """
+    try:
+        return describe_image(image_content.read(), deadline)
         
     except Exception as e:
         print(f"Error in analysis: {str(e)}")
         return f"food dish (Error: {str(e)})"
 
+async def analyze_food_image_async(image_content, deadline=None) -> str:
+    """
+    analyze_food_image for async views: the model call runs on llm_calls
+    instead of the event loop, and concurrent uploads of the same image
+    share one call. Bounded by deadline, or LLM_CALL_TIMEOUT without one.
+    """
+    try:
+        image_bytes = image_content.read()
+        timeout = time_left(deadline, LLM_CALL_TIMEOUT)
+        return await llm_calls.run(hashlib.sha256(image_bytes).hexdigest(), describe_image,
+                                   image_bytes, monotonic() + timeout, timeout=timeout)
+
+    except asyncio.TimeoutError:
+        logger.error("Error in image analysis: timed out")
+        return "food dish (Error: timed out)"
+    except Exception as e:
+        logger.error(f"Error in image analysis: {str(e)}")
+        return f"food dish (Error: {str(e)})"
+
 if __name__ == '__main__':
     pass
@@ -1,9 +1,13 @@
 import logging
 import asyncio
-import aiohttp
 import random
-import re
-from typing import List, Union
+from time import monotonic
+from typing import List, Optional, Tuple, Union
+from app.utils.concurrency import AsyncLimiter, time_left
+from app.utils.data_preprocessing import parse_image_urls
+from app.utils.http_client import HTTPClient
+from app.utils.request_scheduler import PRIORITY_INTERACTIVE
+from app.utils.source_health import SourceHealth
 from app.utils.scrapers.google_scraper import GoogleScraper
 from app.utils.scrapers.food_network_scraper import FoodNetworkScraper
 from app.utils.scrapers.allrecipes_scraper import AllRecipesScraper
@@ -13,7 +17,14 @@ from app.utils.scrapers.fooddotcom_scraper import FoodDotComScraper
 logger = logging.getLogger(__name__)
 
 class ImageSearchService:
-    def __init__(self):
+    search_timeout = 60  # Seconds a single recipe's scraper search may take
+
+    def __init__(self, cache=None, max_concurrency=8, http_client=None):
+        self.cache = cache
+        # Caps recipes being scraped at once across all requests
+        self.limiter = AsyncLimiter(max_concurrency)
+        # One pooled session shared by every scraper and request for the app's lifetime
+        self.http_client = http_client or HTTPClient()
         self.scrapers = [
             GoogleScraper(),
             FoodNetworkScraper(),
@@ -21,28 +32,40 @@ class ImageSearchService:
             WikimediaScraper(),
             FoodDotComScraper()
         ]
-        self.session = None
+        for scraper in self.scrapers:
+            scraper.session = self.http_client.session
+        # Latency/success statistics, adaptive timeouts and circuit breakers per source
+        self.source_health = {type(scraper).__name__: SourceHealth(type(scraper).__name__)
+                              for scraper in self.scrapers}
         self.placeholder_images = [
             "https://drive.google.com/file/d/1gYOjs06yiq7EUXaO19BE-L7MkrTR6wlc/view?usp=sharing",
             "https://drive.google.com/file/d/1ob4KbzVLtwsE_ckYKBu_70FLEXNCJRSr/view?usp=sharing",
             "https://drive.google.com/file/d/1UUv3zF1ouXteZVt8Oc_UXORcJrlWfRXR/view?usp=sharing"
         ]
 
-    async def __aenter__(self):
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
-            for scraper in self.scrapers:
-                scraper.session = self.session
-        logger.info("ImageSearchService session initialized")
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-            self.session = None
-        logger.info("ImageSearchService session closed")
-
-    async def search_recipe_images(self, recipe_name: str, image_data: Union[str, float, int], num_images: int = 3) -> List[str]:
+    def close(self):
+        self.http_client.close()
+        logger.info("ImageSearchService closed")
+
+    def _placeholders(self, num_images: int) -> List[str]:
+        selected_placeholders = []
+        for _ in range(num_images):
+            placeholder = random.choice(self.placeholder_images)
+            while placeholder in selected_placeholders and len(selected_placeholders) < len(self.placeholder_images):
+                placeholder = random.choice(self.placeholder_images)
+            selected_placeholders.append(placeholder)
+        return selected_placeholders
+
+    async def search_recipe_images(self, recipe_name: str, image_data: Union[List[str], str, float, int, None] = None,
+                                   num_images: int = 3, recipe_id: int = None,
+                                   deadline: Optional[float] = None) -> List[str]:
+        """
+        Return up to num_images image URLs for a recipe.
+
+        deadline is a time.monotonic() value; once it passes, scrapers still
+        running are cancelled and whatever they found by then is returned, or
+        placeholders if nothing was.
+        """
         logger.info(f"Searching images for recipe: {recipe_name}")
         
         # First try to get existing URLs from the database
@@ -50,38 +73,21 @@ class ImageSearchService:
         if existing_urls:
             logger.info(f"Found {len(existing_urls)} existing URLs")
             return existing_urls[:num_images]
+
+        # Then the persistent cache of earlier scraper results; [] is a cached miss
+        use_cache = self.cache is not None and recipe_id is not None
+        if use_cache:
+            cached_urls = self.cache.get(recipe_id, recipe_name)
+            if cached_urls:
+                return cached_urls[:num_images]
+            if cached_urls is not None:
+                logger.info("Cached negative entry, using placeholder images")
+                return self._placeholders(num_images)
         
         try:
             # Try to get images from scrapers
-            all_results = []
-            tasks = []
-            
-            for scraper in self.scrapers:
-                task = asyncio.create_task(scraper.search_images(recipe_name, num_images))
-                tasks.append(task)
-            
-            logger.info(f"Created {len(tasks)} scraper tasks")
-            done, pending = await asyncio.wait(tasks, timeout=60)
-            
-            for task in pending:
-                logger.warning(f"Cancelling pending task for {task.get_coro().__name__}")
-                task.cancel()
-            
-            for task in done:
-                try:
-                    results = await task
-                    logger.info(f"Scraper {task.get_coro().__name__} found {len(results)} images")
-                    all_results.extend(results)
-                except Exception as e:
-                    logger.error(f"Error in scraper task {task.get_coro().__name__}: {str(e)}")
-            
-            # Get unique results
-            seen = set()
-            unique_results = []
-            for url in all_results:
-                if url not in seen:
-                    seen.add(url)
-                    unique_results.append(url)
+            unique_results, _ = await self.scrape_recipe_images(recipe_name, num_images,
+                                                                recipe_id if use_cache else None, deadline)
             
             if unique_results:
                 logger.info(f"Found {len(unique_results)} unique image URLs")
@@ -89,38 +95,146 @@ class ImageSearchService:
             
             # If no images found, return random placeholder images
             logger.info("No images found, using placeholder images")
-            selected_placeholders = []
-            for _ in range(num_images):
-                placeholder = random.choice(self.placeholder_images)
-                while placeholder in selected_placeholders and len(selected_placeholders) < len(self.placeholder_images):
-                    placeholder = random.choice(self.placeholder_images)
-                selected_placeholders.append(placeholder)
-            
-            return selected_placeholders
+            return self._placeholders(num_images)
             
         except Exception as e:
             logger.error(f"Error in image search: {str(e)}")
             # Return placeholder images even in case of error
             return random.sample(self.placeholder_images, min(num_images, len(self.placeholder_images)))
 
-    def extract_urls_from_image_column(self, image_data: Union[str, float, int]) -> List[str]:
-        logger.debug(f"Extracting URLs from image data: {image_data}")
-        if image_data is None or image_data == 'NA' or isinstance(image_data, (float, int)):
-            logger.debug("No valid image data found in database")
-            return []
-        
+    async def scrape_recipe_images(self, recipe_name: str, num_images: int = 3, recipe_id: int = None,
+                                   deadline: Optional[float] = None,
+                                   priority: int = PRIORITY_INTERACTIVE) -> Tuple[List[str], bool]:
+        """
+        Run the scrapers for one recipe under the concurrency limit and
+        return (unique URLs, complete); see _run_scrapers. Complete results,
+        including empty ones, are written to the cache when recipe_id is given.
+        priority is the outbound scheduler class of the scrapers' requests.
+        """
+        # Scraping stops at the deadline, and never runs past the per-search cap
+        deadline = min(deadline if deadline is not None else float('inf'), monotonic() + self.search_timeout)
         try:
-            image_data_str = str(image_data)
-            urls = []
-            if image_data_str.startswith('c(') and image_data_str.endswith(')'):
-                content = image_data_str[2:-1].strip()
-                parts = re.findall(r'"([^"]*)"', content)
-                urls = [url for url in parts if url.startswith('http')]
-            else:
-                urls = re.findall(r'https?://[^\s,"\')]+', image_data_str)
-            
-            logger.info(f"Extracted {len(urls)} URLs from image column")
-            return urls
-        except Exception as e:
-            logger.error(f"Error extracting URLs from image data: {str(e)}")
-            return []
\ No newline at end of file
+            # Wait for a free slot no longer than the deadline allows
+            await asyncio.wait_for(self.limiter.acquire(), time_left(deadline))
+        except asyncio.TimeoutError:
+            logger.info("Deadline passed waiting to scrape")
+            return [], False
+
+        try:
+            unique_results, complete = await self.http_client.run(
+                self._run_scrapers(recipe_name, num_images, deadline), priority
+            )
+        finally:
+            self.limiter.release()
+
+        # A search cut short by the deadline or by failing sources may have missed images, so only cache complete ones
+        if self.cache is not None and recipe_id is not None and complete:
+            self.cache.set(recipe_id, recipe_name, unique_results)
+        return unique_results, complete
+
+    async def _search_source(self, scraper, recipe_name: str, num_images: int, deadline: float) -> List[str]:
+        """
+        Run one scraper under its adaptive timeout and record the outcome in its SourceHealth.
+        """
+        health = self.source_health[type(scraper).__name__]
+        started = monotonic()
+        own_deadline = started + health.timeout()
+        source_deadline = min(deadline, own_deadline)
+        try:
+            results = await asyncio.wait_for(scraper.search_images(recipe_name, num_images, source_deadline),
+                                             time_left(source_deadline))
+        except asyncio.CancelledError:
+            # Lost the race to other sources: no verdict on this one
+            health.release_probe()
+            raise
+        except asyncio.TimeoutError:
+            self._record_timeout(health, started, own_deadline, deadline)
+            raise
+        except Exception:
+            health.record(monotonic() - started, False)
+            raise
+
+        if not results and monotonic() >= source_deadline:
+            # Emptied by running out of time (verifications cut short), not a real "no images"
+            self._record_timeout(health, started, own_deadline, deadline)
+            raise asyncio.TimeoutError()
+        health.record(monotonic() - started, True, empty=not results)
+        return results
+
+    @staticmethod
+    def _record_timeout(health, started: float, own_deadline: float, deadline: float):
+        # Only the source's own timeout says something about the source
+        if own_deadline <= deadline:
+            health.record(monotonic() - started, False)
+        else:
+            health.release_probe()
+
+    async def _run_scrapers(self, recipe_name: str, num_images: int, deadline: float) -> Tuple[List[str], bool]:
+        """
+        Race the scrapers and return (unique URLs, complete) as soon as
+        num_images unique URLs are in, cancelling the scrapers still running.
+        Unless num_images URLs were found, complete is False when the
+        deadline passed before every scraper finished, when a scraper failed
+        (raised or ran out of time), or when an open circuit skipped a
+        source: an empty result is only trusted when every source answered.
+
+        Sources are started, and their results preferred, in order of their
+        historical success rate and latency.
+        """
+        ranked = sorted(self.scrapers, key=lambda scraper: self.source_health[type(scraper).__name__].rank_key())
+        tasks = {}
+        skipped = False
+        failed = False
+        for scraper in ranked:
+            name = type(scraper).__name__
+            if not self.source_health[name].allow_request():
+                logger.info(f"Skipping {name}, its circuit is open")
+                skipped = True
+                continue
+            tasks[asyncio.create_task(self._search_source(scraper, recipe_name, num_images, deadline))] = name
+        logger.info(f"Created {len(tasks)} scraper tasks")
+
+        seen = set()
+        unique_results = []
+        pending = set(tasks)
+        try:
+            while pending and len(unique_results) < num_images:
+                timeout = time_left(deadline)
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in [task for task in tasks if task in done]:
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        logger.error(f"Error in scraper task {tasks[task]}: {str(e) or type(e).__name__}")
+                        failed = True
+                        continue
+                    logger.info(f"Scraper {tasks[task]} found {len(results)} images")
+                    for url in results:
+                        if url not in seen:
+                            seen.add(url)
+                            unique_results.append(url)
+        finally:
+            # Also reached when the caller is cancelled, so no scraper outlives its lookup
+            for task in pending:
+                logger.info(f"Cancelling pending task for {tasks[task]}")
+                task.cancel()
+
+        return unique_results, (not pending and not skipped and not failed) or len(unique_results) >= num_images
+
+    def source_stats(self):
+        """
+        Return the health statistics of every image source, best ranked first.
+        """
+        ranked = sorted(self.source_health.values(), key=lambda health: health.rank_key())
+        return {health.name: health.snapshot() for health in ranked}
+
+    def extract_urls_from_image_column(self, image_data: Union[List[str], str, float, int, None]) -> List[str]:
+        """
+        Return the image URLs of a recipe: URL lists parsed at build time are
+        used as-is, raw Images column values are parsed with parse_image_urls.
+        """
+        if isinstance(image_data, list):
+            return image_data
+        return parse_image_urls(image_data)
@@ -1,32 +1,89 @@
+from time import monotonic
 import logging
+import os
 from app.services.image_search import ImageSearchService
 from app.utils.data_loading import load_or_create_data
-from app.utils.recommendation_utils import get_top_recommendations
+from app.utils.feature_engineering import DEFAULT_FEATURE_WEIGHTS
+from app.utils.http_client import HTTPClient
+from app.utils.image_cache import ImageCache
+from app.utils.recommendation_utils import get_top_recommendations, get_top_recommendations_batch
 
 logger = logging.getLogger(__name__)
 
 class FlexibleRecipeRecommendationSystem:
-    def __init__(self, csv_file_path, precomputed_dir):
-        self.default_feature_weights = {
-            'ingredients': 0.15, 'category': 0.25, 'dietary': 0.20,
-            'calories': 0.10, 'time': 0.10, 'keywords': 0.10, 'keywords_name': 0.10
-        }
-        self.image_search_service = ImageSearchService()
-        self.data = load_or_create_data(csv_file_path, precomputed_dir, self.default_feature_weights)
+    def __init__(self, csv_file_path, precomputed_dir, ann_n_probe=16, image_cache_ttl=7 * 24 * 3600,
+                 image_cache_negative_ttl=24 * 3600, image_cache_lru_size=4096, image_search_concurrency=8,
+                 http_connector_options=None, http_host_limits=None, batch_chunk_size=16, request_deadline=10):
+        self.default_feature_weights = dict(DEFAULT_FEATURE_WEIGHTS)
+        self.batch_chunk_size = batch_chunk_size
+        self.ann_n_probe = ann_n_probe
+        self.request_deadline = request_deadline
+        self.data = load_or_create_data(csv_file_path, precomputed_dir)
+        self.image_cache = ImageCache(os.path.join(precomputed_dir, 'image_cache.sqlite'),
+                                      ttl=image_cache_ttl, negative_ttl=image_cache_negative_ttl,
+                                      lru_size=image_cache_lru_size)
+        self.image_search_service = ImageSearchService(cache=self.image_cache,
+                                                       max_concurrency=image_search_concurrency,
+                                                       http_client=HTTPClient(http_connector_options,
+                                                                              http_host_limits))
 
     async def get_recommendations(self, category=None, dietary_preference=None, ingredients=None,
                                   calories=None, time=None, keywords=None, keywords_name=None,
-                                  top_n=6, feature_weights=None):
+                                  top_n=6, feature_weights=None, overfetch=3, search_mode='exact',
+                                  n_probe=None, deadline=None):
         # Use the provided feature_weights, or fall back to the default if not provided
         weights = feature_weights or self.default_feature_weights
 
+        if search_mode not in ('exact', 'approximate'):
+            raise ValueError(f"Unknown search_mode: {search_mode}")
+
         return await get_top_recommendations(
-            self.data['df'], self.data['combined_matrix'], 
+            self.data['recipe_store'], self.data['block_matrices'], self.data['block_sq_norms'],
+            self.data['category_offsets'], self.data['inverted_index'], self.data['ivf_index'],
             self.data['tfidf_vectorizer_ingredients'],
             self.data['tfidf_vectorizer_keywords'], 
             self.data['tfidf_vectorizer_keywords_name'],
-            self.data['category_dummies'], self.data['scaler'], 
+            self.data['category_dummies'], self.data['scalers'], 
             weights, self.image_search_service,
             category, dietary_preference, ingredients, 
-            calories, time, keywords, keywords_name, top_n
-        )
\ No newline at end of file
+            calories, time, keywords, keywords_name, top_n, overfetch,
+            search_mode, n_probe or self.ann_n_probe, deadline or self.new_deadline()
+        )
+
+    async def get_batch_recommendations(self, queries, top_n=6, feature_weights=None, overfetch=3, deadline=None):
+        """
+        Recommend for several queries at once, scored with one sparse product.
+
+        queries is a list of dicts with the get_recommendations query keywords
+        (category, dietary_preference, ingredients, calories, time, keywords,
+        keywords_name); one result list is returned per query, in order.
+        """
+        weights = feature_weights or self.default_feature_weights
+
+        return await get_top_recommendations_batch(
+            self.data['recipe_store'], self.data['block_matrices'], self.data['block_sq_norms'],
+            self.data['category_offsets'], self.data['tfidf_vectorizer_ingredients'],
+            self.data['tfidf_vectorizer_keywords'], self.data['tfidf_vectorizer_keywords_name'],
+            self.data['category_dummies'], self.data['scalers'],
+            weights, self.image_search_service, queries, top_n, overfetch, deadline or self.new_deadline(),
+            self.batch_chunk_size
+        )
+
+    def new_deadline(self):
+        """
+        Return the time.monotonic() deadline for a request starting now.
+        """
+        return monotonic() + self.request_deadline
+
+    def close(self):
+        """
+        Release the pooled HTTP session and the image cache connection.
+        """
+        self.image_search_service.close()
+        self.image_cache.close()
+
+    def to_json(self, matches):
+        """
+        Serialize the RecipeMatch results of get_recommendations as JSON bytes.
+        """
+        return self.data['recipe_store'].render_json(matches)
@@ -0,0 +1,83 @@
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+from sklearn.preprocessing import normalize
+from app.utils.feature_engineering import FEATURE_BLOCKS, compute_block_sq_norms
+from app.utils.similarity_calculation import block_weights, calculate_base_similarity
+from app.utils.ranking import select_top_k
+
+logger = logging.getLogger(__name__)
+
+_ASSIGN_CHUNK_ROWS = 8192
+
+def _assign(matrix, centroids):
+    """
+    Return the index of the most similar centroid for every row, in chunks
+    so the (rows x lists) similarity matrix stays small.
+    """
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], _ASSIGN_CHUNK_ROWS):
+        chunk = matrix[start:start + _ASSIGN_CHUNK_ROWS]
+        assignments[start:start + chunk.shape[0]] = np.asarray(chunk @ centroids.T).argmax(axis=1)
+    return assignments
+
+def _membership(assignments, n_lists):
+    n_rows = len(assignments)
+    return csr_matrix((np.ones(n_rows), (assignments, np.arange(n_rows))), shape=(n_lists, n_rows))
+
+def build_ivf_index(block_matrices, feature_weights, n_lists=None, n_iter=10, seed=0):
+    """
+    Build an IVF (inverted file) index over the recipe feature space.
+
+    Recipes are clustered with spherical k-means on the row-normalized,
+    feature_weights-weighted concatenation of the blocks. Each list keeps
+    its member rows plus an unweighted per-block centroid, so centroids
+    are ranked at query time with the same block-weighted cosine as the
+    recipes themselves, for any weight dict.
+    """
+    weights = block_weights(feature_weights)
+    matrix = normalize(hstack([block_matrices[name] * weight
+                               for name, weight in zip(FEATURE_BLOCKS, weights)]).tocsr())
+    n_rows = matrix.shape[0]
+    n_lists = n_lists or int(np.clip(np.sqrt(n_rows), 1, 4096))
+    rng = np.random.default_rng(seed)
+
+    centroids = matrix[rng.choice(n_rows, n_lists, replace=False)].toarray()
+    for _ in range(n_iter):
+        assignments = _assign(matrix, centroids)
+        centroids = np.asarray((_membership(assignments, n_lists) @ matrix).todense())
+        empty = np.flatnonzero(~centroids.any(axis=1))
+        if len(empty):
+            centroids[empty] = matrix[rng.choice(n_rows, len(empty), replace=False)].toarray()
+        centroids = normalize(centroids)
+    assignments = _assign(matrix, centroids)
+
+    membership = _membership(assignments, n_lists)
+    sizes = np.asarray(membership.sum(axis=1)).ravel()
+    mean_membership = csr_matrix(membership.multiply(1 / np.maximum(sizes, 1)[:, None]))
+    centroid_blocks = {name: csr_matrix(mean_membership @ block_matrices[name]) for name in FEATURE_BLOCKS}
+
+    logger.info(f"Built IVF index with {n_lists} lists over {n_rows} recipes")
+    return {
+        'centroid_blocks': centroid_blocks,
+        'centroid_sq_norms': compute_block_sq_norms(centroid_blocks),
+        'list_offsets': np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        'list_rows': np.argsort(assignments, kind='stable'),
+    }
+
+def ivf_candidate_rows(ivf_index, query_blocks, feature_weights, n_probe, rows=None):
+    """
+    Return the sorted rows of the n_probe lists whose centroids are most
+    similar to the query, clipped to the rows slice when given.
+    """
+    centroid_scores = calculate_base_similarity(query_blocks, ivf_index['centroid_blocks'],
+                                                ivf_index['centroid_sq_norms'], feature_weights)
+    offsets = ivf_index['list_offsets']
+    probed = select_top_k(centroid_scores, max(n_probe, 1))
+    candidates = np.sort(np.concatenate(
+        [ivf_index['list_rows'][offsets[list_id]:offsets[list_id + 1]] for list_id in probed]
+    ))
+
+    if rows is not None:
+        candidates = candidates[(candidates >= rows.start) & (candidates < rows.stop)]
+    return candidates
@@ -0,0 +1,94 @@
+from difflib import SequenceMatcher
+import numpy as np
+
+class CategoryMatcher:
+    """
+    Closest dataset category for a free-text category, built once per category list.
+
+    Returns exactly what the original per-call scan did:
+    1. a case-insensitive exact match (also for a single padded word);
+    2. otherwise, for the first word that is a substring of any category,
+       the earliest such category;
+    3. otherwise the difflib.get_close_matches(cutoff) winner (ties going
+       to the greater string), if its SequenceMatcher ratio against the
+       input also exceeds min_ratio; else "".
+
+    Step 1 is a dict lookup and step 2 a lookup in a map from every
+    whitespace-free category substring to the earliest category containing
+    it. For step 3, a character count matrix gives every category's
+    quick_ratio bound at once; SequenceMatcher then visits categories by
+    descending bound and stops when no remaining one can beat the best
+    ratio found, or reach the cutoff.
+    """
+    def __init__(self, categories, cutoff=0.75, min_ratio=0.8):
+        self.categories = list(categories)
+        self.cutoff = cutoff
+        self.min_ratio = min_ratio
+
+        self.exact = {}
+        self.substrings = {}
+        for category in self.categories:
+            lowered = category.lower()
+            self.exact.setdefault(lowered, category)
+            for start in range(len(lowered)):
+                for end in range(start + 1, len(lowered) + 1):
+                    if lowered[end - 1].isspace():
+                        break  # Input words never contain whitespace
+                    self.substrings.setdefault(lowered[start:end], category)
+
+        self._candidates = list(self.exact)
+        self._alphabet = {char: index for index, char in enumerate(sorted(set(''.join(self._candidates))))}
+        self._char_counts = np.zeros((len(self._candidates), len(self._alphabet)), dtype=np.int64)
+        for row, candidate in enumerate(self._candidates):
+            for char in candidate:
+                self._char_counts[row, self._alphabet[char]] += 1
+        self._lengths = np.array([len(candidate) for candidate in self._candidates], dtype=np.int64)
+
+    def match(self, category):
+        if not category:
+            return ""
+
+        lowered = category.lower()
+        if lowered in self.exact:
+            return self.exact[lowered]
+
+        parts = lowered.split()
+        if len(parts) == 1 and parts[0] in self.exact:
+            return self.exact[parts[0]]
+
+        for part in parts:
+            if part in self.substrings:
+                return self.substrings[part]
+
+        return self._fuzzy_match(lowered)
+
+    def _fuzzy_match(self, lowered):
+        counts = np.zeros(len(self._alphabet), dtype=np.int64)
+        for char in lowered:
+            index = self._alphabet.get(char)
+            if index is not None:
+                counts[index] += 1
+        # Characters in common bound the matching characters, as in quick_ratio
+        common = np.minimum(self._char_counts, counts).sum(axis=1)
+        bounds = 2.0 * common / (self._lengths + len(lowered))
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(lowered)
+        best = None
+        for row in np.argsort(-bounds, kind='stable'):
+            bound = bounds[row]
+            if bound < self.cutoff or (best is not None and bound < best[0]):
+                break
+            candidate = self._candidates[row]
+            matcher.set_seq1(candidate)
+            score = matcher.ratio()
+            # get_close_matches keeps the largest (score, string) pair
+            if score >= self.cutoff and (best is None or (score, candidate) > best):
+                best = (score, candidate)
+
+        if best is None:
+            return ""
+        # The confirming ratio compares the other way round, which SequenceMatcher need not score the same
+        if SequenceMatcher(None, lowered, best[1]).ratio() > self.min_ratio:
+            return self.exact[best[1]]
+        return ""
@@ -0,0 +1,157 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+import asyncio
+import threading
+
+def time_left(deadline, cap=None):
+    """
+    Seconds until deadline (a time.monotonic() value), at least 0 and at most cap.
+    A deadline of None means no deadline: cap is returned as-is.
+    """
+    if deadline is None:
+        return cap
+    left = max(0.0, deadline - monotonic())
+    return left if cap is None else min(left, cap)
+
+class AsyncLimiter:
+    """
+    Counting semaphore for coroutines that may run on different event loops.
+
+    Flask runs each async view in its own event loop, so an asyncio.Semaphore
+    (bound to one loop) cannot cap work across concurrent requests. Slots are
+    tracked under a thread lock instead, and a waiter is woken on its own loop
+    with call_soon_threadsafe.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self._in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, waiter))
+                except ValueError:
+                    # The slot was handed over just before the cancellation; pass it on
+                    self._release_locked()
+            raise
+
+    def release(self):
+        with self._lock:
+            self._release_locked()
+
+    def _release_locked(self):
+        # Hand the slot straight to the oldest waiter so _in_use stays unchanged
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(_wake, waiter)
+            return
+        self._in_use -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+class BlockingCallPool:
+    """
+    Bounded thread pool running blocking calls (such as LLM SDK requests)
+    for coroutines on any event loop, with single-flight coalescing.
+
+    At most max_workers calls run at once and the rest queue. A call whose
+    key matches one already in flight is not submitted again: the caller
+    waits for the running call's result instead, so N simultaneous requests
+    for the same input make one upstream call. Each caller's timeout or
+    cancellation only stops that caller waiting; the call itself keeps
+    running for the others.
+    """
+    def __init__(self, max_workers, name='blocking-call'):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._call_seconds = 0.0
+        self.counters = {'calls': 0, 'coalesced': 0, 'errors': 0, 'timeouts': 0}
+
+    def _call(self, fn, args):
+        with self._lock:
+            self._running += 1
+        started = monotonic()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._call_seconds += monotonic() - started
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if not future.cancelled() and future.exception() is not None:
+                self.counters['errors'] += 1
+
+    async def run(self, key, fn, *args, timeout=None):
+        """
+        Return fn(*args), sharing the call with concurrent callers using the
+        same key. Raises asyncio.TimeoutError after timeout seconds.
+        """
+        if timeout is not None and timeout <= 0:
+            # Deadline already passed; don't queue a call nobody will wait for
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise asyncio.TimeoutError
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._call, fn, args)
+                self._in_flight[key] = future
+                self.counters['calls'] += 1
+                submitted = True
+            else:
+                self.counters['coalesced'] += 1
+                submitted = False
+        if submitted:
+            # Outside the lock: the callback runs at once if the call has already finished
+            future.add_done_callback(lambda done: self._forget(key, done))
+
+        try:
+            # shield keeps a departing caller from cancelling the call the others share
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            finished = self.counters['calls'] - len(self._in_flight)
+            return dict(self.counters, running=self._running, in_flight=len(self._in_flight),
+                        max_workers=self.max_workers,
+                        mean_call_seconds=self._call_seconds / finished if finished else None)
@@ -2,32 +2,58 @@ import os
 import joblib
 from scipy.sparse import save_npz, load_npz
 import pandas as pd
-from app.utils.data_preprocessing import preprocess_data
-from app.utils.feature_engineering import create_feature_matrices
-
-def load_or_create_data(csv_file_path, precomputed_dir, feature_weights):
-    files = ['df', 'tfidf_vectorizer_ingredients', 'tfidf_vectorizer_keywords',
-             'tfidf_vectorizer_keywords_name', 'category_dummies', 'scaler']
-    
-    if all(os.path.exists(os.path.join(precomputed_dir, f'{f}.joblib')) for f in files) and \
-       os.path.exists(os.path.join(precomputed_dir, 'combined_matrix.npz')):
-        return load_precomputed_data(precomputed_dir)
+from app.utils.ann_index import build_ivf_index
+from app.utils.data_preprocessing import (compute_category_offsets, parse_image_urls, preprocess_data,
+                                          sort_by_category)
+from app.utils.feature_engineering import (DEFAULT_FEATURE_WEIGHTS, FEATURE_BLOCKS, compute_block_sq_norms,
+                                           create_feature_matrices)
+from app.utils.inverted_index import build_inverted_index
+from app.utils.recipe_store import RecipeStore
+
+ARTIFACT_FILES = ['df', 'tfidf_vectorizer_ingredients', 'tfidf_vectorizer_keywords',
+                  'tfidf_vectorizer_keywords_name', 'category_dummies', 'scalers', 'block_sq_norms', 'category_offsets']
+
+def _block_path(precomputed_dir, name):
+    return os.path.join(precomputed_dir, f'block_{name}.npz')
+
+def load_or_create_data(csv_file_path, precomputed_dir):
+    if all(os.path.exists(os.path.join(precomputed_dir, f'{f}.joblib')) for f in ARTIFACT_FILES) and \
+       all(os.path.exists(_block_path(precomputed_dir, name)) for name in FEATURE_BLOCKS):
+        data = load_precomputed_data(precomputed_dir)
     else:
-        return compute_and_save_data(csv_file_path, precomputed_dir, feature_weights)
+        data = compute_and_save_data(csv_file_path, precomputed_dir)
+
+    data['inverted_index'] = build_inverted_index(data['block_matrices'])
+    data['recipe_store'] = RecipeStore(data['df'])
+    return data
 
 def load_precomputed_data(precomputed_dir):
     data = {}
-    for f in ['df', 'tfidf_vectorizer_ingredients', 'tfidf_vectorizer_keywords',
-              'tfidf_vectorizer_keywords_name', 'category_dummies', 'scaler']:
+    for f in ARTIFACT_FILES:
         data[f] = joblib.load(os.path.join(precomputed_dir, f'{f}.joblib'))
-    data['combined_matrix'] = load_npz(os.path.join(precomputed_dir, 'combined_matrix.npz'))
+
+    # Dataframes saved before image URLs were parsed at build time only need the column added
+    if 'ImageUrls' not in data['df']:
+        data['df']['ImageUrls'] = data['df']['Images'].apply(parse_image_urls)
+        joblib.dump(data['df'], os.path.join(precomputed_dir, 'df.joblib'))
+    data['block_matrices'] = {
+        name: load_npz(_block_path(precomputed_dir, name)).tocsr() for name in FEATURE_BLOCKS
+    }
+
+    # The ANN index is optional, so artifacts built without it only need it added
+    ivf_path = os.path.join(precomputed_dir, 'ivf_index.joblib')
+    if os.path.exists(ivf_path):
+        data['ivf_index'] = joblib.load(ivf_path)
+    else:
+        data['ivf_index'] = build_ivf_index(data['block_matrices'], DEFAULT_FEATURE_WEIGHTS)
+        joblib.dump(data['ivf_index'], ivf_path)
     return data
 
-def compute_and_save_data(csv_file_path, precomputed_dir, feature_weights):
-    df = preprocess_data(pd.read_csv(csv_file_path))
-    results = create_feature_matrices(df, feature_weights)
-    combined_matrix, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords, \
-    tfidf_vectorizer_keywords_name, category_dummies, scaler = results
+def compute_and_save_data(csv_file_path, precomputed_dir):
+    df = sort_by_category(preprocess_data(pd.read_csv(csv_file_path)))
+    results = create_feature_matrices(df)
+    block_matrices, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords, \
+    tfidf_vectorizer_keywords_name, category_dummies, scalers = results
 
     os.makedirs(precomputed_dir, exist_ok=True)
     data = {
@@ -36,12 +62,14 @@ def compute_and_save_data(csv_file_path, precomputed_dir, feature_weights):
         'tfidf_vectorizer_keywords': tfidf_vectorizer_keywords,
         'tfidf_vectorizer_keywords_name': tfidf_vectorizer_keywords_name,
         'category_dummies': category_dummies,
-        'scaler': scaler,
-        'combined_matrix': combined_matrix
+        'scalers': scalers,
+        'block_sq_norms': compute_block_sq_norms(block_matrices),
+        'category_offsets': compute_category_offsets(df),
+        'ivf_index': build_ivf_index(block_matrices, DEFAULT_FEATURE_WEIGHTS)
     }
     for name, obj in data.items():
-        if name == 'combined_matrix':
-            save_npz(os.path.join(precomputed_dir, f'{name}.npz'), obj)
-        else:
-            joblib.dump(obj, os.path.join(precomputed_dir, f'{name}.joblib'))
-    return data
\ No newline at end of file
+        joblib.dump(obj, os.path.join(precomputed_dir, f'{name}.joblib'))
+    for name, matrix in block_matrices.items():
+        save_npz(_block_path(precomputed_dir, name), matrix)
+    data['block_matrices'] = block_matrices
+    return data
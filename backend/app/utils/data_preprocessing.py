@@ -64,9 +64,41 @@ def preprocess_data(df):
     list_columns = ['Keywords', 'keywords_name']
     for col in list_columns:
         df[col] = df[col].apply(parse_list_string)
+
+    # Parse image URLs once here instead of per recommended recipe
+    df['ImageUrls'] = df['Images'].apply(parse_image_urls)
     
     return df
 
+def parse_image_urls(s):
+    """
+    Parse the Images column, an R vector like c("https://...", "https://...")
+    or a bare string of URLs, into a list of URLs.
+    """
+    if not isinstance(s, str) or s == 'NA':
+        return []
+    if s.startswith('c(') and s.endswith(')'):
+        return [url for url in re.findall(r'"([^"]*)"', s[2:-1]) if url.startswith('http')]
+    return re.findall(r'https?://[^\s,"\')]+', s)
+
+def sort_by_category(df):
+    """
+    Physically order the recipes by RecipeCategory so every category is a
+    contiguous block of rows. The sort is stable, keeping dataset order
+    within a category.
+    """
+    return df.sort_values('RecipeCategory', kind='mergesort', na_position='last').reset_index(drop=True)
+
+def compute_category_offsets(df):
+    """
+    Map each RecipeCategory of a category-sorted dataframe to its
+    (start, stop) row range.
+    """
+    return {
+        category: (int(rows[0]), int(rows[-1]) + 1)
+        for category, rows in df.groupby('RecipeCategory', sort=False).indices.items()
+    }
+
 def parse_list_string(s):
     """
     Safely parse list-like strings.
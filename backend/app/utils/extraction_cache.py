@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+
+def normalize_text(text):
+    """
+    Fold case, punctuation and whitespace so that phrasings like "Pasta recipe!"
+    and "pasta  recipe" share a cache entry.
+    """
+    return ' '.join(_NON_WORD_RE.sub(' ', text.casefold()).split())
+
+class ExtractionCache:
+    """
+    Persistent cache of parsed LLM attribute extractions, keyed by (prompt
+    version, normalized input text).
+
+    The prompt version is a hash of everything besides the text that shapes
+    the model output, so changing the prompt or model leaves old entries
+    unused until they expire. Only successfully parsed output is stored;
+    the caller applies its post-processing to every hit. As with ImageCache,
+    entries live in a SQLite file with an expiry time behind an in-process LRU.
+    """
+    def __init__(self, path, ttl=30 * 24 * 3600, lru_size=1024):
+        self.path = path
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'expired': 0,
+                         'lru_evictions': 0, 'writes': 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS extractions ('
+            'prompt_version TEXT NOT NULL, text TEXT NOT NULL, result TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, PRIMARY KEY (prompt_version, text))'
+        )
+        self._conn.commit()
+        self.purge_expired()
+
+    def _remember(self, key, result_json, expires_at):
+        self._lru[key] = (result_json, expires_at)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+            self.counters['lru_evictions'] += 1
+
+    def get(self, prompt_version, text):
+        """
+        Return a fresh copy of the cached result for the normalized text, or None on a miss.
+        """
+        key = (prompt_version, text)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._lru.move_to_end(key)
+                    self.counters['lru_hits'] += 1
+                    return json.loads(entry[0])
+                del self._lru[key]
+
+            row = self._conn.execute(
+                'SELECT result, expires_at FROM extractions WHERE prompt_version = ? AND text = ?', key
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            if row[1] <= now:
+                self._conn.execute('DELETE FROM extractions WHERE prompt_version = ? AND text = ?', key)
+                self._conn.commit()
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            self._remember(key, row[0], row[1])
+            self.counters['db_hits'] += 1
+            return json.loads(row[0])
+
+    def set(self, prompt_version, text, result):
+        """
+        Store the parsed model output for the normalized text.
+        """
+        key = (prompt_version, text)
+        # Stored serialized so callers can never mutate a cached result
+        result_json = json.dumps(result)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO extractions (prompt_version, text, result, expires_at) VALUES (?, ?, ?, ?)',
+                (prompt_version, text, result_json, expires_at)
+            )
+            self._conn.commit()
+            self._remember(key, result_json, expires_at)
+            self.counters['writes'] += 1
+
+    def purge_expired(self):
+        """
+        Delete expired entries from the database; return how many were removed.
+        """
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM extractions WHERE expires_at <= ?', (time.time(),)).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info(f"Purged {removed} expired extraction cache entries")
+        return removed
+
+    def stats(self):
+        """
+        Return the hit/miss/eviction counters along with the current sizes.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['lru_size'] = len(self._lru)
+            stats['lru_capacity'] = self.lru_size
+            stats['db_entries'] = self._conn.execute('SELECT COUNT(*) FROM extractions').fetchone()[0]
+        lookups = stats['lru_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['lru_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,29 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import MinMaxScaler
-from scipy.sparse import hstack
+from scipy.sparse import csr_matrix
 import pandas as pd
 import numpy as np
 
-def create_feature_matrices(df, feature_weights):
+DIETARY_COLUMNS = ['is_vegetarian', 'is_vegan', 'is_gluten free', 'is_dairy free',
+                   'is_low carb', 'is_keto', 'is_paleo']
+
+# Order of the feature blocks; also the column order of the block norm table
+FEATURE_BLOCKS = ['ingredients', 'category', 'dietary', 'calories', 'time',
+                  'keywords', 'keywords_name', 'rating']
+
+RATING_WEIGHT = 0.05  # Small weight for ratings in base similarity
+
+DEFAULT_FEATURE_WEIGHTS = {
+    'ingredients': 0.15, 'category': 0.25, 'dietary': 0.20,
+    'calories': 0.10, 'time': 0.10, 'keywords': 0.10, 'keywords_name': 0.10
+}
+
+def create_feature_matrices(df):
     """
-    Create feature matrices for the recommendation system.
+    Create the per-block feature matrices for the recommendation system.
+
+    Blocks are stored unweighted; feature weights are applied at query time
+    by calculate_weighted_similarity, so changing them needs no rebuild.
     """
     tfidf_vectorizer_ingredients = TfidfVectorizer(
         stop_words='english',
@@ -14,105 +31,91 @@ def create_feature_matrices(df, feature_weights):
         ngram_range=(1, 2),
         min_df=1
     )
-    
+
     ingredients_text = df['RecipeIngredientParts'].apply(lambda x: ' '.join(x) if x else '')
     tfidf_matrix_ingredients = tfidf_vectorizer_ingredients.fit_transform(ingredients_text)
 
     tfidf_vectorizer_keywords = TfidfVectorizer(stop_words='english', max_features=3000)
     tfidf_vectorizer_keywords_name = TfidfVectorizer(stop_words='english', max_features=3000)
-    
+
     keywords_text = df['Keywords'].apply(lambda x: ' '.join(x) if x else '')
     keywords_name_text = df['keywords_name'].apply(lambda x: ' '.join(x) if x else '')
-    
+
     tfidf_matrix_keywords = tfidf_vectorizer_keywords.fit_transform(keywords_text)
     tfidf_matrix_keywords_name = tfidf_vectorizer_keywords_name.fit_transform(keywords_name_text)
 
     category_dummies = pd.get_dummies(df['RecipeCategory'])
-    category_matrix = category_dummies.values
-
-    dietary_columns = ['is_vegetarian', 'is_vegan', 'is_gluten free', 'is_dairy free', 
-                     'is_low carb', 'is_keto', 'is_paleo']
-    dietary_matrix = df[dietary_columns].values
-
-    scaler = MinMaxScaler()
-    calories_matrix = scaler.fit_transform(df[['Calories']].values)
-    time_matrix = scaler.fit_transform(df[['TotalTime_minutes']].values)
-    rating_matrix = scaler.fit_transform(df[['AggregatedRating']].values)
-
-    combined_matrix = hstack([
-        tfidf_matrix_ingredients * feature_weights['ingredients'],
-        category_matrix * feature_weights['category'],
-        dietary_matrix * feature_weights['dietary'],
-        calories_matrix * feature_weights['calories'],
-        time_matrix * feature_weights['time'],
-        tfidf_matrix_keywords * feature_weights['keywords'],
-        tfidf_matrix_keywords_name * feature_weights['keywords_name'],
-        rating_matrix * 0.05  # Small weight for ratings in base similarity
+    category_matrix = category_dummies.values.astype(float)
+
+    dietary_matrix = df[DIETARY_COLUMNS].values.astype(float)
+
+    # One scaler per column, so each query value is scaled with its own range
+    scalers = {
+        'calories': MinMaxScaler().fit(df[['Calories']].values),
+        'time': MinMaxScaler().fit(df[['TotalTime_minutes']].values),
+        'rating': MinMaxScaler().fit(df[['AggregatedRating']].values),
+    }
+
+    block_matrices = {
+        'ingredients': tfidf_matrix_ingredients,
+        'category': category_matrix,
+        'dietary': dietary_matrix,
+        'calories': scalers['calories'].transform(df[['Calories']].values),
+        'time': scalers['time'].transform(df[['TotalTime_minutes']].values),
+        'keywords': tfidf_matrix_keywords,
+        'keywords_name': tfidf_matrix_keywords_name,
+        'rating': scalers['rating'].transform(df[['AggregatedRating']].values),
+    }
+    block_matrices = {name: csr_matrix(block_matrices[name]) for name in FEATURE_BLOCKS}
+
+    return (block_matrices, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+            tfidf_vectorizer_keywords_name, category_dummies, scalers)
+
+def compute_block_sq_norms(block_matrices):
+    """
+    Return an (n_recipes x n_blocks) array of squared row norms per block,
+    with columns in FEATURE_BLOCKS order.
+    """
+    return np.column_stack([
+        np.asarray(block_matrices[name].multiply(block_matrices[name]).sum(axis=1)).ravel()
+        for name in FEATURE_BLOCKS
     ])
 
-    return (combined_matrix, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords, 
-            tfidf_vectorizer_keywords_name, category_dummies, scaler)
+def _one_hot(index, width):
+    return csr_matrix((np.ones(1), (np.zeros(1, dtype=np.int32), np.array([index]))), shape=(1, width))
 
-def create_query_vector(combined_matrix, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
-                        tfidf_vectorizer_keywords_name, category_dummies, scaler, feature_weights, **kwargs):
+def create_query_vector(tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                        tfidf_vectorizer_keywords_name, category_dummies, scalers, **kwargs):
     """
-    Create a query vector based on user input.
+    Create the query as a dict of unweighted sparse (1 x block width) CSR rows.
+
+    Blocks the user gave no input for are left out, so they contribute
+    nothing to the similarity numerator or the query norm.
     """
-    query_vector = np.zeros((1, combined_matrix.shape[1]))
-    current_position = 0
+    query_blocks = {}
 
     if kwargs.get('ingredients'):
-        ingredients_query = tfidf_vectorizer_ingredients.transform([' '.join(kwargs['ingredients'])])
-        query_vector[:, :ingredients_query.shape[1]] = ingredients_query.toarray() * feature_weights['ingredients']
-        current_position += ingredients_query.shape[1]
+        query_blocks['ingredients'] = tfidf_vectorizer_ingredients.transform([' '.join(kwargs['ingredients'])])
 
-    category_vector = np.zeros((1, category_dummies.shape[1]))
     if kwargs.get('category') and kwargs['category'] in category_dummies.columns:
-        category_index = category_dummies.columns.get_loc(kwargs['category'])
-        category_vector[0, category_index] = 1
-    query_vector[:, current_position:current_position + category_dummies.shape[1]] = (
-        category_vector * feature_weights['category']
-    )
-    current_position += category_dummies.shape[1]
-
-    dietary_columns = ['is_vegetarian', 'is_vegan', 'is_gluten free', 'is_dairy free', 
-                       'is_low carb', 'is_keto', 'is_paleo']
-    dietary_vector = np.zeros((1, len(dietary_columns)))
-    if kwargs.get('dietary_preference') in dietary_columns:
-        dietary_index = dietary_columns.index(kwargs['dietary_preference'])
-        dietary_vector[0, dietary_index] = 1
-    query_vector[:, current_position:current_position + len(dietary_columns)] = (
-        dietary_vector * feature_weights['dietary']
-    )
-    current_position += len(dietary_columns)
+        query_blocks['category'] = _one_hot(category_dummies.columns.get_loc(kwargs['category']),
+                                            category_dummies.shape[1])
+
+    if kwargs.get('dietary_preference') in DIETARY_COLUMNS:
+        query_blocks['dietary'] = _one_hot(DIETARY_COLUMNS.index(kwargs['dietary_preference']),
+                                           len(DIETARY_COLUMNS))
 
-    calories_vector = np.zeros((1, 1))
-    time_vector = np.zeros((1, 1))
-    
     if kwargs.get('calories'):
-        calories_vector[0, 0] = kwargs['calories']
+        query_blocks['calories'] = csr_matrix(scalers['calories'].transform([[kwargs['calories']]]))
     if kwargs.get('time'):
-        time_vector[0, 0] = kwargs['time']
-        
-    calories_vector = scaler.transform(calories_vector)
-    time_vector = scaler.transform(time_vector)
-    
-    query_vector[:, current_position:current_position + 1] = calories_vector * feature_weights['calories']
-    current_position += 1
-    query_vector[:, current_position:current_position + 1] = time_vector * feature_weights['time']
-    current_position += 1
+        query_blocks['time'] = csr_matrix(scalers['time'].transform([[kwargs['time']]]))
 
     if kwargs.get('keywords'):
-        keywords_query = tfidf_vectorizer_keywords.transform([' '.join(kwargs['keywords'])])
-        query_vector[:, current_position:current_position + keywords_query.shape[1]] = (
-            keywords_query.toarray() * feature_weights['keywords']
-        )
-        current_position += keywords_query.shape[1]
+        query_blocks['keywords'] = tfidf_vectorizer_keywords.transform([' '.join(kwargs['keywords'])])
 
     if kwargs.get('keywords_name'):
-        keywords_name_query = tfidf_vectorizer_keywords_name.transform([' '.join(kwargs['keywords_name'])])
-        query_vector[:, current_position:current_position + keywords_name_query.shape[1]] = (
-            keywords_name_query.toarray() * feature_weights['keywords_name']
+        query_blocks['keywords_name'] = tfidf_vectorizer_keywords_name.transform(
+            [' '.join(kwargs['keywords_name'])]
         )
 
-    return query_vector
\ No newline at end of file
+    return query_blocks
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import threading
+import aiohttp
+from app.utils.request_scheduler import RequestScheduler, with_priority
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTOR_OPTIONS = {
+    'limit': 100,  # Open connections in total
+    'limit_per_host': 10,
+    'ttl_dns_cache': 300,  # Seconds
+    'keepalive_timeout': 30,  # Seconds an idle connection is kept for reuse
+}
+
+class HTTPClient:
+    """
+    App-lifetime aiohttp session running on its own event loop thread.
+
+    Flask runs every async view in a fresh event loop, and an aiohttp
+    session is bound to the loop it was created on, so a session owned by
+    a request cannot outlive it. Instead one session with a pooled
+    TCPConnector lives on a background loop, and request coroutines hand
+    their HTTP work to that loop with run(), keeping keep-alive connections
+    and DNS entries across requests.
+
+    Every request goes through a RequestScheduler, which applies the
+    per-host rate and concurrency limits in host_limits.
+    """
+    def __init__(self, connector_options=None, host_limits=None):
+        self.connector_options = dict(DEFAULT_CONNECTOR_OPTIONS, **(connector_options or {}))
+        self.scheduler = RequestScheduler(host_limits)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='http-client', daemon=True)
+        self._thread.start()
+        self.session = asyncio.run_coroutine_threadsafe(self._create_session(), self.loop).result()
+        logger.info(f"HTTP client started with connector options {self.connector_options}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _create_session(self):
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(**self.connector_options),
+                                     trace_configs=[self.scheduler.trace_config()])
+
+    async def run(self, coro, priority=None):
+        """
+        Await coro on the client's loop. Cancelling the caller cancels coro.
+
+        priority sets the scheduler priority class of the requests coro
+        makes; by default they are interactive.
+        """
+        if priority is not None:
+            coro = with_priority(coro, priority)
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stats(self):
+        return self.scheduler.stats()
+
+    def close(self, timeout=10):
+        """
+        Close the session and stop the loop thread. Safe to call more than once.
+        """
+        if self.loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result(timeout)
+            # Also stops the thread pool the scrapers parse pages in
+            asyncio.run_coroutine_threadsafe(self.loop.shutdown_default_executor(), self.loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Error closing HTTP session: {str(e)}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.loop.close()
+        logger.info("HTTP client closed")
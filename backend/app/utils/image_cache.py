@@ -0,0 +1,165 @@
+from collections import OrderedDict
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ImageCache:
+    """
+    Persistent cache of resolved recipe image URLs, keyed by (recipe id, name).
+
+    Entries live in a SQLite file with an expiry time; an empty URL list is a
+    negative entry meaning the scrapers found nothing, so the recipe goes
+    straight to placeholders until it expires. A small in-process LRU sits in
+    front of the database for hot recipes.
+    """
+    def __init__(self, path, ttl=7 * 24 * 3600, negative_ttl=24 * 3600, lru_size=4096):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'expired': 0,
+                         'lru_evictions': 0, 'writes': 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Requests run on Flask worker threads, so one connection is shared under the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS image_urls ('
+            'recipe_id INTEGER NOT NULL, name TEXT NOT NULL, urls TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, PRIMARY KEY (recipe_id, name))'
+        )
+        self._conn.commit()
+
+    def _remember(self, key, urls, expires_at):
+        self._lru[key] = (urls, expires_at)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+            self.counters['lru_evictions'] += 1
+
+    def get(self, recipe_id, name):
+        """
+        Return the cached URL list ([] for a negative entry), or None on a miss.
+        """
+        key = (int(recipe_id), name)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._lru.move_to_end(key)
+                    self.counters['lru_hits'] += 1
+                    return list(entry[0])
+                del self._lru[key]
+
+            row = self._conn.execute(
+                'SELECT urls, expires_at FROM image_urls WHERE recipe_id = ? AND name = ?', key
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            if row[1] <= now:
+                self._conn.execute('DELETE FROM image_urls WHERE recipe_id = ? AND name = ?', key)
+                self._conn.commit()
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            urls = json.loads(row[0])
+            self._remember(key, urls, row[1])
+            self.counters['db_hits'] += 1
+            return list(urls)
+
+    def has_entry(self, recipe_id, name):
+        """
+        Return whether an unexpired entry exists, without touching the LRU or counters.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM image_urls WHERE recipe_id = ? AND name = ? AND expires_at > ?',
+                (int(recipe_id), name, time.time())
+            ).fetchone()
+        return row is not None
+
+    def set(self, recipe_id, name, urls):
+        """
+        Store the URLs resolved for a recipe; an empty list stores a negative entry.
+        """
+        key = (int(recipe_id), name)
+        urls = list(urls)
+        expires_at = time.time() + (self.ttl if urls else self.negative_ttl)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO image_urls (recipe_id, name, urls, expires_at) VALUES (?, ?, ?, ?)',
+                (key[0], key[1], json.dumps(urls), expires_at)
+            )
+            self._conn.commit()
+            self._remember(key, urls, expires_at)
+            self.counters['writes'] += 1
+
+    def stats(self):
+        """
+        Return the hit/miss/eviction counters along with the current sizes.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats['lru_size'] = len(self._lru)
+            stats['lru_capacity'] = self.lru_size
+            stats['db_entries'] = self._conn.execute('SELECT COUNT(*) FROM image_urls').fetchone()[0]
+        lookups = stats['lru_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['lru_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class VerificationCache:
+    """
+    In-memory results of image URL verification, keyed by URL.
+
+    Shared by every scraper so an image that several sources link to (or a
+    later request finds again) is checked with a HEAD only once per TTL.
+    """
+    def __init__(self, ttl=24 * 3600, negative_ttl=3600, max_entries=50000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, url):
+        """
+        Return the cached verification result for url, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[1] <= time.time():
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(url)
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def set(self, url, valid):
+        expires_at = time.time() + (self.ttl if valid else self.negative_ttl)
+        with self._lock:
+            self._entries[url] = (valid, expires_at)
+            self._entries.move_to_end(url)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=len(self._entries))
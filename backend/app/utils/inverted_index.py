@@ -0,0 +1,40 @@
+import numpy as np
+from app.utils.feature_engineering import FEATURE_BLOCKS
+from app.utils.similarity_calculation import block_weights
+
+# Blocks backed by a tfidf_vectorizer_* vocabulary
+TEXT_BLOCKS = ['ingredients', 'keywords', 'keywords_name']
+
+def build_inverted_index(block_matrices):
+    """
+    Build term -> posting list indexes for the TF-IDF blocks.
+
+    A CSC copy of each block is its inverted index: the row indices stored
+    for column t are the recipes whose text contains vocabulary term t.
+    """
+    return {name: block_matrices[name].tocsc() for name in TEXT_BLOCKS}
+
+def candidate_rows(inverted_index, query_blocks, feature_weights, rows=None):
+    """
+    Return the sorted rows that can score above zero, or None for a full scan.
+
+    Pruning is exact: it is only used when every weighted block in the query
+    is a text block, so a recipe sharing no query term has a zero numerator.
+    Queries with no text terms, or with weighted category, dietary or
+    scalar inputs, return None.
+    """
+    weights = dict(zip(FEATURE_BLOCKS, block_weights(feature_weights)))
+    active = [name for name, block in query_blocks.items() if block.nnz and weights[name]]
+    if not active or any(name not in TEXT_BLOCKS for name in active):
+        return None
+
+    postings = []
+    for name in active:
+        index = inverted_index[name]
+        for term in query_blocks[name].indices:
+            postings.append(index.indices[index.indptr[term]:index.indptr[term + 1]])
+    candidates = np.unique(np.concatenate(postings))
+
+    if rows is not None:
+        candidates = candidates[(candidates >= rows.start) & (candidates < rows.stop)]
+    return candidates
@@ -0,0 +1,110 @@
+from time import monotonic
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+RULE_FIELDS = ('keywords', 'keywords_name', 'ingredients')
+
+def compile_rules(rules):
+    """
+    Compile rule dicts into (regex, rank of each pattern's rule, rules by priority).
+
+    The regex is one lookahead alternation of every pattern, ordered by rule
+    priority, so a single scan reports, at each position of the text, the
+    highest-priority pattern starting there.
+    """
+    ordered = [rule for _, rule in sorted(enumerate(rules), key=lambda item: (item[1].get('priority', 0), item[0]))]
+    ranks = {}
+    for rank, rule in enumerate(ordered):
+        if not rule.get('patterns'):
+            raise ValueError(f"Rule without patterns: {rule}")
+        for pattern in rule['patterns']:
+            if not pattern:
+                raise ValueError(f"Empty pattern in rule: {rule}")
+            ranks.setdefault(pattern.lower(), rank)
+    regex = re.compile('(?=(' + '|'.join(re.escape(pattern) for pattern in ranks) + '))')
+    return regex, ranks, ordered
+
+class KeywordRules:
+    """
+    Keyword augmentation rules read from a JSON file, for extracted attributes
+    without a dataset category.
+
+    Each rule has patterns (substrings of the lowercased input), the
+    keywords, keywords_name and ingredients it appends, a priority, and
+    optional variants: {"when": substring, ...fields} replacing some of
+    those fields when the input contains the substring. As with the elif
+    chain this replaces, only the matching rule with the lowest priority
+    (then the earliest in the file) applies.
+
+    All patterns are matched in one pass (see compile_rules). The file is
+    checked for changes at most every check_interval seconds and reloaded
+    when its modification time changes; an invalid file is logged and the
+    previous rules kept.
+    """
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = monotonic()
+        self._compiled = self._load()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding='utf-8') as file:
+            compiled = compile_rules(json.load(file))
+        self._mtime = mtime
+        logger.info(f"Loaded {len(compiled[2])} keyword rules from {self.path}")
+        return compiled
+
+    def _reload_if_changed(self):
+        now = monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                if os.stat(self.path).st_mtime != self._mtime:
+                    self._compiled = self._load()
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Keeping previous keyword rules, could not reload {self.path}: {str(e)}")
+
+    def match(self, text):
+        """
+        Return the rule that applies to text, or None.
+        """
+        self._reload_if_changed()
+        regex, ranks, ordered = self._compiled
+        best = None
+        for match in regex.finditer(text.lower()):
+            rank = ranks[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        return None if best is None else ordered[best]
+
+    def apply(self, result, text):
+        """
+        Append the matching rule's keywords, keywords_name and ingredients to result.
+        Returns whether a rule matched.
+        """
+        rule = self.match(text)
+        if rule is None:
+            return False
+        fields = dict(rule)
+        lowered = text.lower()
+        for variant in rule.get('variants', []):
+            if variant['when'].lower() in lowered:
+                fields.update(variant)
+                break
+        for field in RULE_FIELDS:
+            result[field] = result.get(field, []) + fields.get(field, [])
+        return True
@@ -0,0 +1,71 @@
+import numpy as np
+
+def select_top_k(scores, k, mask=None):
+    """
+    Return the indices of the k highest scores, best first.
+
+    Uses np.argpartition so only the k winners are sorted. Ties are broken
+    by ascending index, so the selection is deterministic. mask is an
+    optional boolean array; entries where it is False are never selected.
+    """
+    candidates = np.flatnonzero(mask) if mask is not None else None
+    values = scores if candidates is None else scores[candidates]
+    k = min(k, len(values))
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    if k < len(values):
+        kth = len(values) - k
+        threshold = values[np.argpartition(values, kth)[kth]]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        winners = np.concatenate([above, ties])
+    else:
+        winners = np.arange(len(values))
+
+    winners = winners[np.lexsort((winners, -values[winners]))]
+    return winners if candidates is None else candidates[winners]
+
+def iter_top_k(scores, k, overfetch=3, mask=None):
+    """
+    Yield indices in descending score order, selecting k * overfetch at a time.
+
+    Callers that drop candidates simply keep iterating: once the buffer is
+    used up the next, twice as large, selection is taken from the same
+    scores, so nothing is re-scored. Because selection is tie-stable, each
+    larger selection starts with the previous one.
+    """
+    buffer_size = max(k * overfetch, 1)
+    total = len(scores) if mask is None else int(np.count_nonzero(mask))
+    yielded = 0
+
+    while yielded < total:
+        selection = select_top_k(scores, buffer_size, mask)
+        for idx in selection[yielded:]:
+            yield int(idx)
+        yielded = len(selection)
+        buffer_size *= 2
+
+def select_top_k_batch(scores, k):
+    """
+    Row-wise select_top_k for a (n_queries x n) score matrix.
+
+    Returns an (n_queries x k) index array, each row best first with ties
+    broken by ascending index, using one argpartition for the whole batch.
+    """
+    n_queries, n = scores.shape
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((n_queries, 0), dtype=np.intp)
+
+    kth = n - k
+    partitioned = np.argpartition(scores, kth, axis=1)[:, kth:kth + 1]
+    thresholds = np.take_along_axis(scores, partitioned, axis=1)
+    above = scores > thresholds
+    ties = scores == thresholds
+    needed = k - above.sum(axis=1, keepdims=True)
+    selected = above | (ties & (np.cumsum(ties, axis=1) <= needed))
+
+    winners = np.nonzero(selected)[1].reshape(n_queries, k)
+    values = np.take_along_axis(scores, winners, axis=1)
+    return np.take_along_axis(winners, np.lexsort((winners, -values), axis=-1), axis=1)
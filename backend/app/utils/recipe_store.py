@@ -0,0 +1,108 @@
+from dataclasses import fields
+from itertools import chain
+import json
+import numpy as np
+from app.models.recipe import Recipe
+
+LIST_FIELDS = ['RecipeIngredientParts', 'Keywords', 'keywords_name',
+               'RecipeIngredientQuantities', 'RecipeInstructions']
+
+# Recipe fields that are set per request; everything else is static per row
+REQUEST_FIELDS = ('Images', 'Similarity')
+STATIC_FIELDS = [field.name for field in fields(Recipe) if field.name not in REQUEST_FIELDS]
+
+def _pack_lists(series):
+    """
+    Flatten a column of lists into (values, offsets): row i's list is
+    values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(series) + 1, dtype=np.int64)
+    np.cumsum(series.map(len).to_numpy(), out=offsets[1:])
+    values = np.empty(offsets[-1], dtype=object)
+    values[:] = list(chain.from_iterable(series))
+    return values, offsets
+
+class RecipeStore:
+    """
+    Columnar, read-only copy of the recipe dataframe for the request path.
+
+    Numeric fields are contiguous numpy arrays (with their maxima
+    precomputed for the calorie/time penalties), string fields are object
+    arrays and list fields are offset-indexed flat arrays, so scoring and
+    result materialization never touch pandas.
+
+    Each row's static fields are serialized to a JSON fragment the first
+    time the row is returned and reused afterwards, so responses are
+    assembled by splicing bytes rather than re-encoding the ingredient and
+    instruction lists.
+    """
+    def __init__(self, df):
+        self.size = len(df)
+        self.recipe_ids = df['RecipeId'].to_numpy(dtype=np.int64)
+        self.names = df['Name'].to_numpy(dtype=object)
+        self.categories = df['RecipeCategory'].to_numpy(dtype=object)
+        self.descriptions = df['Description'].to_numpy(dtype=object)
+
+        self.calories = df['Calories'].to_numpy(dtype=np.float64)
+        self.total_time = df['TotalTime_minutes'].to_numpy(dtype=np.float64)
+        self.ratings = df['AggregatedRating'].to_numpy(dtype=np.float64)
+        self.review_counts = df['ReviewCount'].to_numpy(dtype=np.float64).astype(np.int64)
+        self.calories_max = float(self.calories.max())
+        self.total_time_max = float(self.total_time.max())
+
+        self._lists = {field: _pack_lists(df[field]) for field in LIST_FIELDS + ['ImageUrls']}
+        self.has_images = np.diff(self._lists['ImageUrls'][1]) > 0
+        self._payloads = [None] * self.size
+
+    def list_field(self, field, row):
+        values, offsets = self._lists[field]
+        return values[offsets[row]:offsets[row + 1]].tolist()
+
+    def image_urls(self, row, limit=None):
+        """
+        Return the dataset image URLs of one row, parsed at build time.
+        """
+        values, offsets = self._lists['ImageUrls']
+        stop = offsets[row + 1] if limit is None else min(offsets[row] + limit, offsets[row + 1])
+        return values[offsets[row]:stop].tolist()
+
+    def static_fields(self, row):
+        """
+        Return the static Recipe fields of one row as a dict, in Recipe field order.
+        """
+        values = {
+            'RecipeId': int(self.recipe_ids[row]),
+            'Name': self.names[row],
+            'RecipeCategory': self.categories[row],
+            'Calories': float(self.calories[row]),
+            'TotalTime_minutes': int(self.total_time[row]),
+            'AggregatedRating': float(self.ratings[row]),
+            'ReviewCount': int(self.review_counts[row]),
+            'Description': self.descriptions[row],
+        }
+        for field in LIST_FIELDS:
+            values[field] = self.list_field(field, row)
+        return {field: values[field] for field in STATIC_FIELDS}
+
+    def payload(self, row):
+        """
+        Return the cached JSON fragment (the static fields, without braces) of one row.
+        """
+        fragment = self._payloads[row]
+        if fragment is None:
+            fragment = json.dumps(self.static_fields(row), separators=(',', ':'))[1:-1].encode()
+            self._payloads[row] = fragment
+        return fragment
+
+    def render_json(self, matches):
+        """
+        Serialize RecipeMatch results as a JSON array of Recipe objects (bytes).
+        """
+        return b'[' + b','.join(
+            b'{%s,"Images":%s,"Similarity":%s}' % (
+                self.payload(match.row),
+                json.dumps(match.Images, separators=(',', ':')).encode(),
+                json.dumps(float(match.Similarity)).encode()
+            )
+            for match in matches
+        ) + b']'
@@ -1,66 +1,176 @@
+from itertools import islice
+import asyncio
 import logging
-from app.models.recipe import Recipe
+import numpy as np
+from app.models.recipe import RecipeMatch
+from app.utils.ann_index import ivf_candidate_rows
 from app.utils.feature_engineering import create_query_vector
-from app.utils.similarity_calculation import calculate_weighted_similarity
+from app.utils.inverted_index import candidate_rows
+from app.utils.ranking import iter_top_k, select_top_k_batch
+from app.utils.similarity_calculation import calculate_weighted_similarity, calculate_weighted_similarity_batch
 
 logger = logging.getLogger(__name__)
 
-async def get_top_recommendations(df, combined_matrix, tfidf_vectorizer_ingredients,
-                                  tfidf_vectorizer_keywords, tfidf_vectorizer_keywords_name,
-                                  category_dummies, scaler, feature_weights, image_search_service,
+def _absolute_row(rows, idx):
+    """
+    Map an index into the scored subset back to a dataframe row.
+    """
+    if rows is None:
+        return idx
+    if isinstance(rows, slice):
+        return rows.start + idx
+    return int(rows[idx])
+
+async def _resolve_images(recipe_store, image_service, row, deadline):
+    name = recipe_store.names[row]
+    try:
+        return await image_service.search_recipe_images(name, [], 3, recipe_id=int(recipe_store.recipe_ids[row]),
+                                                         deadline=deadline)
+    except Exception as e:
+        logger.error(f"Error searching images for {name}: {str(e)}")
+        return []
+
+async def _build_recipes(recipe_store, image_service, ranked, top_n, deadline=None):
+    """
+    Resolve images for the first top_n (row, similarity) pairs and return
+    RecipeMatch results in rank order.
+
+    Lookups for recipes without dataset images all start together (the
+    service's limiter caps scraping across requests); if this coroutine is
+    cancelled, lookups still in flight are cancelled with it. deadline (a
+    time.monotonic() value) bounds how long any lookup may scrape.
+    """
+    selected = list(islice(ranked, top_n))
+
+    # Most recipes have dataset images, which are a plain lookup in the store
+    lookups = {
+        row: asyncio.create_task(_resolve_images(recipe_store, image_service, row, deadline))
+        for row, _ in selected if not recipe_store.has_images[row]
+    }
+    try:
+        if lookups:
+            await asyncio.gather(*lookups.values())
+    finally:
+        for task in lookups.values():
+            task.cancel()
+
+    return [
+        RecipeMatch(row=row,
+                    Images=lookups[row].result() if row in lookups else recipe_store.image_urls(row, 3),
+                    Similarity=float(similarity))
+        for row, similarity in selected
+    ]
+
+async def get_top_recommendations(recipe_store, block_matrices, block_sq_norms, category_offsets, inverted_index,
+                                  ivf_index, tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                                  tfidf_vectorizer_keywords_name,
+                                  category_dummies, scalers, feature_weights, image_search_service,
                                   category=None, dietary_preference=None, ingredients=None, 
-                                  calories=None, time=None, keywords=None, keywords_name=None, top_n=5):
+                                  calories=None, time=None, keywords=None, keywords_name=None, top_n=5,
+                                  overfetch=3, search_mode='exact', n_probe=16, deadline=None):
     logger.info(f"Starting recommendation process for category: {category}, dietary_preference: {dietary_preference}")
     
-    query_vector = create_query_vector(combined_matrix, tfidf_vectorizer_ingredients,
+    query_blocks = create_query_vector(tfidf_vectorizer_ingredients,
                                        tfidf_vectorizer_keywords, tfidf_vectorizer_keywords_name,
-                                       category_dummies, scaler, feature_weights,
+                                       category_dummies, scalers,
                                        category=category, dietary_preference=dietary_preference,
                                        ingredients=ingredients, calories=calories, time=time,
                                        keywords=keywords, keywords_name=keywords_name)
 
-    similarity_scores = calculate_weighted_similarity(query_vector, combined_matrix, df, calories, time)
-    
+    # Recipes are stored sorted by category, so a category query only scores its own row range
+    rows = None
     if category:
-        similarity_scores *= (df['RecipeCategory'] == category)
-
-    top_indices = similarity_scores.argsort()[-top_n*3:][::-1]
-    logger.info(f"Found {len(top_indices)} potential recommendations")
-
-    results = []
-    async with image_search_service as image_service:
-        for idx in top_indices:
-            if len(results) >= top_n:
-                break
-
-            recipe = df.iloc[idx]
-            
-            if category and recipe['RecipeCategory'] != category:
-                continue
-
-            try:
-                image_urls = await image_service.search_recipe_images(recipe['Name'], recipe['Images'], 3)
-            except Exception as e:
-                logger.error(f"Error searching images for {recipe['Name']}: {str(e)}")
-                image_urls = []
-
-            results.append(Recipe(
-                RecipeId=int(recipe['RecipeId']),
-                Name=recipe['Name'],
-                RecipeCategory=recipe['RecipeCategory'],
-                RecipeIngredientParts=recipe['RecipeIngredientParts'],
-                Keywords=recipe['Keywords'],
-                keywords_name=recipe['keywords_name'],
-                Calories=float(recipe['Calories']),
-                TotalTime_minutes=int(recipe['TotalTime_minutes']),
-                AggregatedRating=float(recipe['AggregatedRating']),
-                ReviewCount=int(recipe['ReviewCount']),
-                Description=recipe['Description'],
-                RecipeIngredientQuantities=recipe['RecipeIngredientQuantities'],
-                RecipeInstructions=recipe['RecipeInstructions'],
-                Images=image_urls,
-                Similarity=float(similarity_scores[idx])
-            ))
+        if category not in category_offsets:
+            logger.info(f"No recipes found for category: {category}")
+            return []
+        rows = slice(*category_offsets[category])
+
+    # Approximate mode scores the recipes in the n_probe closest IVF lists. Text-only queries
+    # score just the recipes on the query terms' posting lists. Too few candidates to fill
+    # the buffer falls back to an exact scan.
+    if search_mode == 'approximate':
+        candidates = ivf_candidate_rows(ivf_index, query_blocks, feature_weights, n_probe, rows)
+    else:
+        candidates = candidate_rows(inverted_index, query_blocks, feature_weights, rows)
+    if candidates is not None and len(candidates) >= top_n * overfetch:
+        logger.info(f"Scoring {len(candidates)} {search_mode} candidates")
+        rows = candidates
+
+    similarity_scores = calculate_weighted_similarity(query_blocks, block_matrices, block_sq_norms,
+                                                      feature_weights, recipe_store, calories, time, rows)
+
+    ranked = ((_absolute_row(rows, idx), similarity_scores[idx])
+              for idx in iter_top_k(similarity_scores, top_n, overfetch))
+    results = await _build_recipes(recipe_store, image_search_service, ranked, top_n, deadline)
 
     logger.info(f"Returning {len(results)} recommendations")
-    return results[:top_n]
\ No newline at end of file
+    return results
+
+def rank_queries_batch(recipe_store, block_matrices, block_sq_norms, category_offsets,
+                       tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords, tfidf_vectorizer_keywords_name,
+                       category_dummies, scalers, feature_weights, queries, k, chunk_size=16):
+    """
+    Score a batch of queries with one sparse product per block and return,
+    for each query, its top k (row, similarity) pairs best first.
+
+    Each query is a dict of get_top_recommendations keyword arguments.
+    Queries are scored chunk_size at a time, so the dense (queries x
+    recipes) score matrices stay the same size however large the batch.
+    """
+    ranked = []
+    for start in range(0, len(queries), chunk_size):
+        ranked.extend(_rank_query_chunk(recipe_store, block_matrices, block_sq_norms, category_offsets,
+                                        tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                                        tfidf_vectorizer_keywords_name, category_dummies, scalers,
+                                        feature_weights, queries[start:start + chunk_size], k))
+    return ranked
+
+def _rank_query_chunk(recipe_store, block_matrices, block_sq_norms, category_offsets,
+                      tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords, tfidf_vectorizer_keywords_name,
+                      category_dummies, scalers, feature_weights, queries, k):
+    """
+    rank_queries_batch for one chunk: the calorie/time penalties, category
+    restriction and top-k selection are applied to its whole score matrix at once.
+    """
+    query_blocks_list = [
+        create_query_vector(tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                            tfidf_vectorizer_keywords_name, category_dummies, scalers, **query)
+        for query in queries
+    ]
+    scores = calculate_weighted_similarity_batch(
+        query_blocks_list, block_matrices, block_sq_norms, feature_weights, recipe_store,
+        [query.get('calories') for query in queries], [query.get('time') for query in queries]
+    )
+
+    # Rows outside a query's category shard can never be selected for it
+    for query_index, query in enumerate(queries):
+        category = query.get('category')
+        if category:
+            start, stop = category_offsets.get(category, (0, 0))
+            scores[query_index, :start] = -np.inf
+            scores[query_index, stop:] = -np.inf
+
+    top_rows = select_top_k_batch(scores, k)
+    top_scores = np.take_along_axis(scores, top_rows, axis=1)
+    return [
+        [(int(row), score) for row, score in zip(rows, row_scores) if score != -np.inf]
+        for rows, row_scores in zip(top_rows, top_scores)
+    ]
+
+async def get_top_recommendations_batch(recipe_store, block_matrices, block_sq_norms, category_offsets,
+                                        tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                                        tfidf_vectorizer_keywords_name, category_dummies, scalers,
+                                        feature_weights, image_search_service, queries, top_n=5, overfetch=3,
+                                        deadline=None, chunk_size=16):
+    logger.info(f"Starting batch recommendation process for {len(queries)} queries")
+
+    ranked_per_query = rank_queries_batch(recipe_store, block_matrices, block_sq_norms, category_offsets,
+                                          tfidf_vectorizer_ingredients, tfidf_vectorizer_keywords,
+                                          tfidf_vectorizer_keywords_name, category_dummies, scalers,
+                                          feature_weights, queries, top_n * overfetch, chunk_size)
+
+    results = await asyncio.gather(*(_build_recipes(recipe_store, image_search_service, ranked, top_n, deadline)
+                                     for ranked in ranked_per_query))
+
+    logger.info(f"Returning recommendations for {len(results)} queries")
+    return results
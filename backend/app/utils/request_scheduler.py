@@ -0,0 +1,251 @@
+from collections import deque
+from contextvars import ContextVar
+from time import monotonic, time
+from email.utils import parsedate_to_datetime
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+PRIORITY_INTERACTIVE = 0  # Work a user request is waiting on
+PRIORITY_BACKGROUND = 1  # Prefetching, backfill
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+DEFAULT_HOST_LIMITS = {
+    'rate': 10.0,  # Requests per second, sustained
+    'burst': 10,  # Requests that may be sent back to back after an idle period
+    'max_concurrency': 6,  # Requests in flight at once
+}
+MAX_BACKOFF = 300  # Seconds a host may pause us for with Retry-After
+DEFAULT_BACKOFF = 30  # Seconds to pause a host that rate limited us without saying how long
+
+_priority = ContextVar('request_priority', default=PRIORITY_INTERACTIVE)
+
+async def with_priority(coro, priority):
+    """
+    Await coro with its outbound requests, and those of tasks it starts, in the given priority class.
+    """
+    token = _priority.set(priority)
+    try:
+        return await coro
+    finally:
+        _priority.reset(token)
+
+def _retry_after(response):
+    """
+    Seconds a rate limiting response asks us to wait: Retry-After as seconds or an HTTP date.
+    """
+    value = response.headers.get('Retry-After')
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time()
+        except (TypeError, ValueError):
+            return DEFAULT_BACKOFF
+    return min(MAX_BACKOFF, max(0.0, seconds))
+
+class _HostState:
+    def __init__(self, rate, burst, max_concurrency):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.tokens = float(burst)
+        self.updated_at = monotonic()
+        self.in_flight = 0
+        self.waiters = []  # Heap of (priority, sequence, future)
+        self.paused_until = 0.0  # monotonic() time a 429/503 backoff ends
+        self.wakeup = None  # Timer handle for the next refill or backoff end
+        self.rate_limited = 0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+class _WaitStats:
+    def __init__(self, window):
+        self.requests = 0
+        self.queued = 0  # Requests that had to wait
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, wait, queued):
+        self.requests += 1
+        self.queued += queued
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent.append(wait)
+
+    def snapshot(self):
+        recent = sorted(self.recent)
+        percentile = lambda fraction: recent[min(len(recent) - 1, int(fraction * len(recent)))] if recent else None
+        return {
+            'requests': self.requests,
+            'queued': self.queued,
+            'mean_wait': self.total_wait / self.requests if self.requests else None,
+            'p50_wait': percentile(0.5),
+            'p95_wait': percentile(0.95),
+            'max_wait': self.max_wait,
+        }
+
+class RequestScheduler:
+    """
+    Per-host outbound request scheduler.
+
+    Each host gets a token bucket (rate requests per second, up to burst at
+    once) and a cap on requests in flight; a request waits until its host
+    has both a token and a free slot. Waiting requests are served by
+    priority class, then arrival, so interactive requests overtake queued
+    background ones, and background requests may not take the last
+    interactive_reserve slots of a host. A 429 or 503 response pauses the
+    host for its Retry-After.
+
+    Installed as an aiohttp TraceConfig: on_request_start waits for a slot,
+    which the session awaits before sending, and the slot is freed when
+    the response headers arrive or the request fails. The priority comes
+    from the caller's context (see with_priority). All scheduling happens
+    on the session's loop; the lock only guards stats() from other threads.
+
+    host_limits maps host names to overrides of DEFAULT_HOST_LIMITS; the
+    'default' entry overrides them for every host.
+
+    Priorities and limits only hold among requests of this process. The
+    backfill job runs its own scheduler, so its background traffic does
+    not yield to the server's requests; what keeps it from crowding them
+    out is the stricter per-host limits it runs with (polite_host_limits).
+    """
+    def __init__(self, host_limits=None, interactive_reserve=1, window=1000):
+        host_limits = dict(host_limits or {})
+        self.default_limits = dict(DEFAULT_HOST_LIMITS, **host_limits.pop('default', {}))
+        self.host_limits = {host: dict(self.default_limits, **limits) for host, limits in host_limits.items()}
+        self.interactive_reserve = interactive_reserve
+        self._hosts = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wait_stats = {priority: _WaitStats(window) for priority in PRIORITY_NAMES}
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(**self.host_limits.get(host, self.default_limits))
+        return state
+
+    def _slots_for(self, state, priority):
+        if priority == PRIORITY_INTERACTIVE or state.max_concurrency <= self.interactive_reserve:
+            return state.max_concurrency
+        return state.max_concurrency - self.interactive_reserve
+
+    def _dispatch(self, state):
+        """
+        Grant slots to waiters in priority order while the host allows it.
+        """
+        now = monotonic()
+        state.refill(now)
+        while state.waiters:
+            priority, _, future = state.waiters[0]
+            if future.done():  # Cancelled while queued
+                heapq.heappop(state.waiters)
+                continue
+            if state.in_flight >= self._slots_for(state, priority):
+                return  # A finishing request dispatches again
+            if now < state.paused_until:
+                self._wake_at(state, state.paused_until)
+                return
+            if state.tokens < 1:
+                self._wake_at(state, now + (1 - state.tokens) / state.rate)
+                return
+            heapq.heappop(state.waiters)
+            state.tokens -= 1
+            state.in_flight += 1
+            future.set_result(None)
+
+    def _wake_at(self, state, when):
+        if state.wakeup is not None:
+            state.wakeup.cancel()
+        loop = asyncio.get_running_loop()
+        state.wakeup = loop.call_at(loop.time() + max(0.0, when - monotonic()), self._wake, state)
+
+    def _wake(self, state):
+        with self._lock:
+            state.wakeup = None
+            self._dispatch(state)
+
+    async def acquire(self, host, priority=None):
+        """
+        Wait for a request slot on host. Every acquire must be paired with a release.
+        """
+        priority = _priority.get() if priority is None else priority
+        started = monotonic()
+        with self._lock:
+            state = self._host(host)
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(state.waiters, (priority, next(self._sequence), future))
+            self._dispatch(state)
+            queued = not future.done()
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future.done() and not future.cancelled():
+                    # Granted just as we were cancelled; hand the slot on
+                    state.in_flight -= 1
+                self._dispatch(state)
+            raise
+        with self._lock:
+            self._wait_stats[priority].record(monotonic() - started, queued)
+
+    def release(self, host, status=None, retry_after=None):
+        """
+        Free a slot on host. status 429 or 503 pauses the host for retry_after seconds.
+        """
+        with self._lock:
+            state = self._hosts[host]
+            state.in_flight -= 1
+            if status in (429, 503):
+                state.rate_limited += 1
+                state.paused_until = max(state.paused_until, monotonic() + retry_after)
+                logger.warning(f"{host} answered {status}, pausing requests for {retry_after:.1f}s")
+            self._dispatch(state)
+
+    def trace_config(self):
+        async def on_request_start(session, context, params):
+            context.host = params.url.host
+            await self.acquire(context.host)
+
+        async def on_request_end(session, context, params):
+            status = params.response.status
+            self.release(context.host, status, _retry_after(params.response) if status in (429, 503) else None)
+
+        async def on_request_exception(session, context, params):
+            self.release(context.host)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def stats(self):
+        """
+        Queue wait times per priority class, and the hosts that are busy or were rate limited.
+        """
+        with self._lock:
+            now = monotonic()
+            hosts = {
+                host: {
+                    'in_flight': state.in_flight,
+                    'queued': sum(not future.done() for _, _, future in state.waiters),
+                    'rate_limited': state.rate_limited,
+                    'paused_for': max(0.0, state.paused_until - now),
+                }
+                for host, state in self._hosts.items()
+                if state.in_flight or state.waiters or state.rate_limited
+            }
+            waits = {PRIORITY_NAMES[priority]: stats.snapshot() for priority, stats in self._wait_stats.items()}
+        return {'wait': waits, 'hosts': hosts, 'tracked_hosts': len(self._hosts)}
@@ -1,38 +1,50 @@
 from bs4 import BeautifulSoup
 from urllib.parse import quote
-from typing import List
-from .base_scraper import BaseScraper
+from typing import List, Optional, Set
+from .base_scraper import HTMLScraper, ScraperError
+from .html_extract import iter_img_attrs
 import logging
 
 logger = logging.getLogger(__name__)
 
-class AllRecipesScraper(BaseScraper):
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+def _keep(src):
+    return src and not any(x in src.lower() for x in ['icon', 'logo', 'advertisement'])
+
+class AllRecipesScraper(HTMLScraper):
+    def parse_images(self, html: str) -> Set[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        images = set()
+        
+        for img in soup.find_all('img'):
+            src = img.get('src') or img.get('data-src')
+            if _keep(src):
+                images.add(src)
+        return images
+
+    def parse_images_fast(self, html: str) -> Set[str]:
+        images = set()
+        for attrs in iter_img_attrs(html):
+            src = attrs.get('src') or attrs.get('data-src')
+            if _keep(src):
+                images.add(src)
+        return images
+
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
         search_query = quote(recipe_name)
         url = f"https://www.allrecipes.com/search?q={search_query}"
         
         try:
-            async with self.session.get(url, headers=await self.get_headers()) as response:
+            async with self.session.get(url, headers=await self.get_headers(),
+                                        timeout=self.request_timeout(deadline)) as response:
                 if response.status != 200:
-                    return []
+                    raise ScraperError(f"HTTP {response.status}")
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                images = set()
-                
-                for img in soup.find_all('img'):
-                    src = img.get('src') or img.get('data-src')
-                    if src and not any(x in src.lower() for x in ['icon', 'logo', 'advertisement']):
-                        images.add(src)
+                images = await self.extract_images(html)
                 
-                valid_images = []
-                for img_url in images:
-                    if len(valid_images) >= num_images:
-                        break
-                    if await self.verify_image_url(img_url):
-                        valid_images.append(img_url)
+                valid_images = await self.verify_image_urls(images, num_images, deadline)
                 
                 return valid_images
         except Exception as e:
             logger.error(f"AllRecipes scraping error: {str(e)}")
-            return []
\ No newline at end of file
+            raise
\ No newline at end of file
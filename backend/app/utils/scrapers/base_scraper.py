@@ -1,12 +1,26 @@
+import asyncio
 import random
 import aiohttp
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, List, Optional, Set
 import logging
+from app.utils.concurrency import time_left
+from app.utils.image_cache import VerificationCache
 
 logger = logging.getLogger(__name__)
 
+class ScraperError(Exception):
+    """
+    A source answered with an error (e.g. blocked or rate limited), as
+    opposed to finding no images.
+    """
+
 class BaseScraper(ABC):
+    # Shared by all scrapers, so a URL verified by one source is not re-checked by another
+    verification_cache = VerificationCache()
+    max_parallel_verifications = 4
+    request_timeout_cap = 60  # Seconds, for any single page fetch or HEAD
+
     def __init__(self):
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -23,16 +37,92 @@ class BaseScraper(ABC):
             'Referer': 'https://www.google.com/',
         }
 
+    def request_timeout(self, deadline: Optional[float] = None) -> aiohttp.ClientTimeout:
+        """
+        aiohttp timeout for one request: the time left until deadline, capped.
+        """
+        return aiohttp.ClientTimeout(total=time_left(deadline, self.request_timeout_cap))
+
     @abstractmethod
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
+        """
+        Return verified image URLs for a recipe; [] when the source has none.
+        Raises when the source fails (HTTP errors, timeouts, bad responses).
+        """
         pass
 
-    async def verify_image_url(self, url: str) -> bool:
+    async def verify_image_url(self, url: str, deadline: Optional[float] = None) -> bool:
+        cached = self.verification_cache.get(url)
+        if cached is not None:
+            return cached
+        if any(x in url.lower() for x in ['placeholder', 'default', 'missing']):
+            return False
+
         try:
-            async with self.session.head(url, allow_redirects=True, timeout=60) as response:
+            async with self.session.head(url, allow_redirects=True, timeout=self.request_timeout(deadline)) as response:
                 content_type = response.headers.get('content-type', '')
-                return (response.status == 200 and 
-                       'image' in content_type and 
-                       not any(x in url.lower() for x in ['placeholder', 'default', 'missing']))
-        except:
-            return False
\ No newline at end of file
+                valid = response.status == 200 and 'image' in content_type
+        except Exception:
+            # Network errors are not cached; the URL may work on the next attempt
+            return False
+
+        self.verification_cache.set(url, valid)
+        return valid
+
+    async def verify_image_urls(self, urls: Iterable[str], num_images: int,
+                                deadline: Optional[float] = None) -> List[str]:
+        """
+        Return up to num_images URLs that pass verify_image_url, in candidate order.
+
+        Up to max_parallel_verifications HEADs are in flight at once; once
+        num_images URLs have passed, the outstanding ones are cancelled.
+        """
+        urls = list(urls)
+        if num_images <= 0 or not urls:
+            return []
+
+        candidates = iter(enumerate(urls))
+        passed = {}
+        workers = []
+
+        async def verify_next():
+            for index, url in candidates:
+                if await self.verify_image_url(url, deadline):
+                    passed[index] = url
+                    if len(passed) >= num_images:
+                        for worker in workers:
+                            if worker is not asyncio.current_task():
+                                worker.cancel()
+                        return
+
+        workers.extend(asyncio.create_task(verify_next())
+                       for _ in range(min(self.max_parallel_verifications, len(urls))))
+        await asyncio.gather(*workers, return_exceptions=True)
+        return [passed[index] for index in sorted(passed)][:num_images]
+
+class HTMLScraper(BaseScraper):
+    """
+    A scraper that finds image candidates in a fetched HTML page.
+    """
+    # Extract image candidates with the targeted tokenizers in html_extract instead of BeautifulSoup
+    fast_html = True
+
+    @abstractmethod
+    def parse_images(self, html: str) -> Set[str]:
+        """
+        Candidate image URLs on a fetched page, found with BeautifulSoup.
+        """
+
+    @abstractmethod
+    def parse_images_fast(self, html: str) -> Set[str]:
+        """
+        Same candidates as parse_images, found without building a DOM.
+        """
+
+    async def extract_images(self, html: str) -> Set[str]:
+        """
+        Run the page parser in the loop's thread pool so a large page does not
+        stall other lookups sharing the event loop.
+        """
+        parser = self.parse_images_fast if self.fast_html else self.parse_images
+        return await asyncio.get_running_loop().run_in_executor(None, parser, html)
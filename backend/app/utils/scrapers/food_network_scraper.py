@@ -1,39 +1,48 @@
 from bs4 import BeautifulSoup
 from urllib.parse import quote
-from .base_scraper import BaseScraper
-from typing import List
+from .base_scraper import HTMLScraper, ScraperError
+from .html_extract import iter_img_attrs
+from typing import List, Optional, Set
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-class FoodNetworkScraper(BaseScraper):
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+class FoodNetworkScraper(HTMLScraper):
+    def parse_images(self, html: str) -> Set[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        images = set()
+        
+        for img in soup.find_all('img', {'data-src': True}):
+            src = img.get('data-src')
+            if src and 'thumbnail' not in src.lower():
+                images.add(src)
+        return images
+
+    def parse_images_fast(self, html: str) -> Set[str]:
+        images = set()
+        for attrs in iter_img_attrs(html):
+            src = attrs.get('data-src')
+            if src and 'thumbnail' not in src.lower():
+                images.add(src)
+        return images
+
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
         search_query = quote(recipe_name)
         url = f"https://www.foodnetwork.com/search/{search_query}-"
         
         try:
-            async with self.session.get(url, headers=await self.get_headers()) as response:
+            async with self.session.get(url, headers=await self.get_headers(),
+                                        timeout=self.request_timeout(deadline)) as response:
                 if response.status != 200:
-                    return []
+                    raise ScraperError(f"HTTP {response.status}")
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                images = set()
-                
-                for img in soup.find_all('img', {'data-src': True}):
-                    src = img.get('data-src')
-                    if src and 'thumbnail' not in src.lower():
-                        images.add(src)
+                images = await self.extract_images(html)
                 
-                valid_images = []
-                for img_url in images:
-                    if len(valid_images) >= num_images:
-                        break
-                    if await self.verify_image_url(img_url):
-                        valid_images.append(img_url)
+                valid_images = await self.verify_image_urls(images, num_images, deadline)
                 
                 return valid_images
         except Exception as e:
             logger.error(f"Food Network scraping error: {str(e)}")
-            return []
\ No newline at end of file
+            raise
\ No newline at end of file
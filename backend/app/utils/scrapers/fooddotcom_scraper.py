@@ -1,65 +1,72 @@
 from bs4 import BeautifulSoup
 import re
-from typing import List
+from typing import List, Optional, Set
 from urllib.parse import quote
-from .base_scraper import BaseScraper
+from .base_scraper import HTMLScraper, ScraperError
+from .html_extract import has_class, iter_img_attrs, iter_img_attrs_in
 import logging
 
 logger = logging.getLogger(__name__)
 
-class FoodDotComScraper(BaseScraper):
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+SIZE_RE = re.compile(r's\d+-c')
+
+def _card_images(card_imgs, fallback_imgs):
+    """
+    Shared selection logic; card_imgs and fallback_imgs are lists of
+    attribute getters (dict.get / Tag.get) for the two kinds of img tags.
+    """
+    images = set()
+    for get in card_imgs:
+        # Check for lazy-loaded images
+        src = get('data-src')
+        if src:
+            # Food.com often uses different image sizes, try to get the largest
+            # Replace size parameters in URL to get larger images
+            images.add(SIZE_RE.sub('s800-c', src))
+
+    for get in card_imgs:
+        # Check for regular images
+        src = get('src')
+        if src and not any(x in src.lower() for x in ['icon', 'logo', 'advertisement']):
+            images.add(SIZE_RE.sub('s800-c', src))
+
+    # If no recipe cards found, try finding images in the main content
+    if not images:
+        for get in fallback_imgs():
+            src = get('src') or get('data-src')
+            if src:
+                images.add(SIZE_RE.sub('s800-c', src))
+    return images
+
+class FoodDotComScraper(HTMLScraper):
+    def parse_images(self, html: str) -> Set[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        # Look for recipe cards which usually contain the main images
+        card_imgs = [img.get for card in soup.find_all('div', {'class': 'recipe-card'}) for img in card.find_all('img')]
+        return _card_images(card_imgs, lambda: [img.get for img in soup.find_all('img', {'class': 'recipe-image'})])
+
+    def parse_images_fast(self, html: str) -> Set[str]:
+        card_imgs = [attrs.get for attrs in iter_img_attrs_in(html, 'recipe-card')]
+        return _card_images(card_imgs, lambda: [attrs.get for attrs in iter_img_attrs(html)
+                                                if has_class(attrs, 'recipe-image')])
+
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
         search_query = quote(recipe_name)
         url = f"https://www.food.com/search/{search_query}?pn=1"
         
         try:
-            async with self.session.get(url, headers=await self.get_headers()) as response:
+            async with self.session.get(url, headers=await self.get_headers(),
+                                        timeout=self.request_timeout(deadline)) as response:
                 if response.status != 200:
-                    return []
+                    raise ScraperError(f"HTTP {response.status}")
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                images = set()
-                
-                # Look for recipe cards which usually contain the main images
-                recipe_cards = soup.find_all('div', {'class': 'recipe-card'})
-                for card in recipe_cards:
-                    # Check for lazy-loaded images
-                    img_tags = card.find_all('img', {'data-src': True})
-                    for img in img_tags:
-                        src = img.get('data-src')
-                        if src:
-                            # Food.com often uses different image sizes, try to get the largest
-                            # Replace size parameters in URL to get larger images
-                            src = re.sub(r's\d+-c', 's800-c', src)
-                            images.add(src)
-                    
-                    # Check for regular images
-                    img_tags = card.find_all('img', {'src': True})
-                    for img in img_tags:
-                        src = img.get('src')
-                        if src and not any(x in src.lower() for x in ['icon', 'logo', 'advertisement']):
-                            src = re.sub(r's\d+-c', 's800-c', src)
-                            images.add(src)
-                
-                # If no recipe cards found, try finding images in the main content
-                if not images:
-                    img_tags = soup.find_all('img', {'class': 'recipe-image'})
-                    for img in img_tags:
-                        src = img.get('src') or img.get('data-src')
-                        if src:
-                            src = re.sub(r's\d+-c', 's800-c', src)
-                            images.add(src)
+                images = await self.extract_images(html)
                 
-                valid_images = []
-                for img_url in images:
-                    if len(valid_images) >= num_images:
-                        break
-                    if await self.verify_image_url(img_url):
-                        valid_images.append(img_url)
+                valid_images = await self.verify_image_urls(images, num_images, deadline)
                 
                 return valid_images
                 
         except Exception as e:
             logger.error(f"Food.com scraping error: {str(e)}")
-            return []
\ No newline at end of file
+            raise
\ No newline at end of file
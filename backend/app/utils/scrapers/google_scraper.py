@@ -1,42 +1,51 @@
 from bs4 import BeautifulSoup
 import re
 from urllib.parse import quote, unquote
-from .base_scraper import BaseScraper
+from .base_scraper import HTMLScraper, ScraperError
+from .html_extract import script_bodies
 import logging
-from typing import List
+from typing import List, Optional, Set
 
 
 logger = logging.getLogger(__name__)
 
-class GoogleScraper(BaseScraper):
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+IMAGE_URL_RE = re.compile(r'(https?://\S+\.(?:jpg|jpeg|png))')
+
+class GoogleScraper(HTMLScraper):
+    def parse_images(self, html: str) -> Set[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        images = set()
+
+        # Extract from JSON-like data in scripts
+        for script in soup.find_all('script'):
+            if script.string and 'AF_initDataCallback' in script.string:
+                urls = IMAGE_URL_RE.findall(script.string)
+                images.update(unquote(url) for url in urls)
+        return images
+
+    def parse_images_fast(self, html: str) -> Set[str]:
+        images = set()
+        for body in script_bodies(html, 'AF_initDataCallback'):
+            images.update(unquote(url) for url in IMAGE_URL_RE.findall(body))
+        return images
+
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
         search_query = f"{recipe_name} recipe food"
         url = f"https://www.google.com/search?q={quote(search_query)}&tbm=isch"
         
         try:
-            async with self.session.get(url, headers=await self.get_headers()) as response:
+            async with self.session.get(url, headers=await self.get_headers(),
+                                        timeout=self.request_timeout(deadline)) as response:
                 if response.status != 200:
-                    return []
+                    raise ScraperError(f"HTTP {response.status}")
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                images = set()
-
-                # Extract from JSON-like data in scripts
-                for script in soup.find_all('script'):
-                    if script.string and 'AF_initDataCallback' in script.string:
-                        urls = re.findall(r'(https?://\S+\.(?:jpg|jpeg|png))', script.string)
-                        images.update(unquote(url) for url in urls)
+                images = await self.extract_images(html)
 
                 # Verify URLs and take only valid ones
-                valid_images = []
-                for img_url in images:
-                    if len(valid_images) >= num_images:
-                        break
-                    if await self.verify_image_url(img_url):
-                        valid_images.append(img_url)
+                valid_images = await self.verify_image_urls(images, num_images, deadline)
 
                 return valid_images
         except Exception as e:
             logger.error(f"Google scraping error: {str(e)}")
-            return []
\ No newline at end of file
+            raise
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Targeted HTML extraction for the scrapers.
+
+Search-result pages are large and the scrapers only need img attributes
+and a few script bodies, so instead of building a BeautifulSoup tree these
+helpers scan the page with a handful of regular expressions. Comments and
+script/style bodies are skipped when looking for tags, as a parser would.
+"""
+from html import unescape
+import re
+from typing import Dict, Iterator, List, Optional
+
+_ATTRS = r'((?:[^>"\']|"[^"]*"|\'[^\']*\')*)'
+
+# Alternatives are tried left to right, so tags inside comments and scripts are consumed unseen
+_IMG_TAG_RE = re.compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>|<img\b' + _ATTRS + '>', re.S | re.I)
+_DIV_OR_IMG_TAG_RE = re.compile(
+    r'<!--.*?-->|<(script|style)\b.*?</\1\s*>|<(div|img)\b' + _ATTRS + r'>|</(div)\s*>', re.S | re.I
+)
+_SCRIPT_RE = re.compile(r'<script\b' + _ATTRS + r'>(.*?)</script\s*>', re.S | re.I)
+_ATTR_RE = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+)))?')
+
+def parse_attrs(attr_text: str) -> Dict[str, str]:
+    """
+    Parse the attribute text of a start tag into a dict, like html.parser:
+    names lowercased, entities unescaped, valueless attributes mapped to ''.
+    """
+    attrs = {}
+    for name, double_quoted, single_quoted, bare in _ATTR_RE.findall(attr_text):
+        value = double_quoted or single_quoted or bare
+        attrs[name.lower()] = unescape(value) if '&' in value else value
+    return attrs
+
+def has_class(attrs: Dict[str, str], class_name: str) -> bool:
+    return class_name in attrs.get('class', '').split()
+
+def iter_img_attrs(html: str) -> Iterator[Dict[str, str]]:
+    """
+    Yield the attribute dict of every img tag outside comments and scripts.
+    """
+    for match in _IMG_TAG_RE.finditer(html):
+        if match.group(2) is not None:
+            yield parse_attrs(match.group(2))
+
+def iter_img_attrs_in(html: str, div_class: str) -> Iterator[Dict[str, str]]:
+    """
+    Yield the attribute dict of every img tag inside a div with class div_class.
+
+    Tracks only div nesting, so it needs no DOM: an img is inside a card
+    while any enclosing open div carries the class.
+    """
+    open_divs: List[bool] = []
+    open_cards = 0
+    for match in _DIV_OR_IMG_TAG_RE.finditer(html):
+        tag = match.group(2)
+        if match.group(4):
+            if open_divs:
+                open_cards -= open_divs.pop()
+        elif tag is None:
+            continue
+        elif tag.lower() == 'div':
+            is_card = has_class(parse_attrs(match.group(3)), div_class)
+            open_divs.append(is_card)
+            open_cards += is_card
+        elif open_cards:
+            yield parse_attrs(match.group(3))
+
+def script_bodies(html: str, marker: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield the text of every script element, or only those containing marker.
+    """
+    for match in _SCRIPT_RE.finditer(html):
+        body = match.group(2)
+        if marker is None or marker in body:
+            yield body
@@ -1,12 +1,12 @@
 from urllib.parse import quote
-from typing import List
-from .base_scraper import BaseScraper
+from typing import List, Optional
+from .base_scraper import BaseScraper, ScraperError
 import logging
 
 logger = logging.getLogger(__name__)
 
 class WikimediaScraper(BaseScraper):
-    async def search_images(self, recipe_name: str, num_images: int) -> List[str]:
+    async def search_images(self, recipe_name: str, num_images: int, deadline: Optional[float] = None) -> List[str]:
         search_query = quote(recipe_name)
         url = f"https://commons.wikimedia.org/w/api.php"
         params = {
@@ -19,9 +19,10 @@ class WikimediaScraper(BaseScraper):
         }
         
         try:
-            async with self.session.get(url, params=params, headers=await self.get_headers()) as response:
+            async with self.session.get(url, params=params, headers=await self.get_headers(),
+                                        timeout=self.request_timeout(deadline)) as response:
                 if response.status != 200:
-                    return []
+                    raise ScraperError(f"HTTP {response.status}")
                 
                 data = await response.json()
                 images = set()
@@ -32,14 +33,9 @@ class WikimediaScraper(BaseScraper):
                         file_url = f"https://commons.wikimedia.org/wiki/Special:FilePath/{quote(title[5:])}"
                         images.add(file_url)
                 
-                valid_images = []
-                for img_url in images:
-                    if len(valid_images) >= num_images:
-                        break
-                    if await self.verify_image_url(img_url):
-                        valid_images.append(img_url)
+                valid_images = await self.verify_image_urls(images, num_images, deadline)
                 
                 return valid_images
         except Exception as e:
             logger.error(f"Wikimedia scraping error: {str(e)}")
-            return []
\ No newline at end of file
+            raise
\ No newline at end of file
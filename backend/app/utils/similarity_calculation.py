@@ -1,22 +1,140 @@
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from app.utils.feature_engineering import FEATURE_BLOCKS, RATING_WEIGHT
 
-def calculate_weighted_similarity(query_vector, combined_matrix, df, target_calories=None, target_time=None):
+_RECIPE_NORM_CACHE_SIZE = 32
+_recipe_norm_cache = {}
+
+def _take_rows(values, rows):
+    return values if rows is None else values[rows]
+
+def block_weights(feature_weights):
+    """
+    Return the per-block weights in FEATURE_BLOCKS order.
+    """
+    return np.array([
+        feature_weights.get(name, RATING_WEIGHT if name == 'rating' else 0.0)
+        for name in FEATURE_BLOCKS
+    ], dtype=float)
+
+def weighted_recipe_norms(block_sq_norms, squared_weights):
+    """
+    Return ||Wm|| for every recipe row, cached per distinct weight vector.
+
+    Routes use a handful of fixed weight dicts, so after the first request
+    for each one this is a lookup rather than a pass over all rows.
+    """
+    key = (id(block_sq_norms), tuple(squared_weights))
+    cached = _recipe_norm_cache.get(key)
+    if cached is not None and cached[0] is block_sq_norms:
+        return cached[1]
+
+    if len(_recipe_norm_cache) >= _RECIPE_NORM_CACHE_SIZE:
+        _recipe_norm_cache.pop(next(iter(_recipe_norm_cache)), None)
+    recipe_norms = np.sqrt(block_sq_norms @ squared_weights)
+    _recipe_norm_cache[key] = (block_sq_norms, recipe_norms)
+    return recipe_norms
+
+def calculate_base_similarity(query_blocks, block_matrices, block_sq_norms, feature_weights, rows=None):
+    """
+    Cosine similarity between the weighted query and every weighted recipe row.
+
+    With per-block weights w_b the cosine over the concatenated blocks is
+    sum_b w_b^2 (M_b q_b) / (||Wq|| * ||Wm||), where ||Wm|| comes from the
+    precomputed block_sq_norms table. Only blocks present in the query and
+    with a nonzero weight need a sparse product.
+
+    rows optionally restricts scoring to a contiguous slice of recipes (a
+    category shard); the returned scores are then indexed relative to it.
+    """
+    squared_weights = block_weights(feature_weights) ** 2
+    recipe_norms = _take_rows(weighted_recipe_norms(block_sq_norms, squared_weights), rows)
+    numerator = np.zeros(len(recipe_norms))
+    query_sq_norm = 0.0
+
+    for block_index, name in enumerate(FEATURE_BLOCKS):
+        query_block = query_blocks.get(name)
+        if query_block is None or query_block.nnz == 0 or squared_weights[block_index] == 0:
+            continue
+        numerator += squared_weights[block_index] * (_take_rows(block_matrices[name], rows) @ query_block.T).toarray().ravel()
+        query_sq_norm += squared_weights[block_index] * query_block.multiply(query_block).sum()
+
+    if query_sq_norm == 0:
+        return numerator
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarity = numerator / (recipe_norms * np.sqrt(query_sq_norm))
+    similarity[recipe_norms == 0] = 0.0
+    return similarity
+
+def calculate_weighted_similarity(query_blocks, block_matrices, block_sq_norms, feature_weights, recipe_store,
+                                  target_calories=None, target_time=None, rows=None):
     """
-    Calculate weighted similarity scores between the query vector and the combined matrix.
+    Calculate weighted similarity scores between the query blocks and the recipe blocks.
     """
-    base_similarity = cosine_similarity(query_vector, combined_matrix).flatten()
-    
+    base_similarity = calculate_base_similarity(query_blocks, block_matrices, block_sq_norms,
+                                                feature_weights, rows)
+
     penalties = np.ones_like(base_similarity)
-    
+
     if target_calories is not None:
-        calorie_diff = np.abs(df['Calories'].values - target_calories)
-        calorie_penalty = 1 - (calorie_diff / df['Calories'].max())
+        calorie_diff = np.abs(_take_rows(recipe_store.calories, rows) - target_calories)
+        calorie_penalty = 1 - (calorie_diff / recipe_store.calories_max)
         penalties *= calorie_penalty
-        
+
     if target_time is not None:
-        time_diff = np.abs(df['TotalTime_minutes'].values - target_time)
-        time_penalty = 1 - (time_diff / df['TotalTime_minutes'].max())
+        time_diff = np.abs(_take_rows(recipe_store.total_time, rows) - target_time)
+        time_penalty = 1 - (time_diff / recipe_store.total_time_max)
         penalties *= time_penalty
-    
-    return base_similarity * penalties
\ No newline at end of file
+
+    return base_similarity * penalties
+
+
+def calculate_base_similarity_batch(query_blocks_list, block_matrices, block_sq_norms, feature_weights):
+    """
+    Batched calculate_base_similarity returning an (n_queries x n_recipes) array.
+
+    Each block's query rows are stacked into one sparse matrix Q_b, so the
+    whole batch is scored with a single Q_b @ M_b^T product per block.
+    """
+    squared_weights = block_weights(feature_weights) ** 2
+    numerator = np.zeros((len(query_blocks_list), block_sq_norms.shape[0]))
+    query_sq_norms = np.zeros(len(query_blocks_list))
+
+    for block_index, name in enumerate(FEATURE_BLOCKS):
+        if squared_weights[block_index] == 0:
+            continue
+        empty_row = csr_matrix((1, block_matrices[name].shape[1]))
+        stacked = vstack([query_blocks.get(name, empty_row) for query_blocks in query_blocks_list]).tocsr()
+        if stacked.nnz == 0:
+            continue
+        numerator += squared_weights[block_index] * (stacked @ block_matrices[name].T).toarray()
+        query_sq_norms += squared_weights[block_index] * np.asarray(stacked.multiply(stacked).sum(axis=1)).ravel()
+
+    recipe_norms = weighted_recipe_norms(block_sq_norms, squared_weights)
+    denominator = np.sqrt(query_sq_norms)[:, None] * recipe_norms[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarity = numerator / denominator
+    similarity[denominator == 0] = 0.0
+    return similarity
+
+def calculate_weighted_similarity_batch(query_blocks_list, block_matrices, block_sq_norms, feature_weights,
+                                        recipe_store, target_calories=None, target_time=None):
+    """
+    Batched calculate_weighted_similarity. target_calories and target_time are
+    per-query sequences (None entries mean no penalty for that query).
+    """
+    similarity = calculate_base_similarity_batch(query_blocks_list, block_matrices, block_sq_norms,
+                                                 feature_weights)
+
+    for values, max_value, targets in ((recipe_store.calories, recipe_store.calories_max, target_calories),
+                                       (recipe_store.total_time, recipe_store.total_time_max, target_time)):
+        if targets is None:
+            continue
+        targets = np.array([np.nan if target is None else target for target in targets], dtype=float)
+        penalized = ~np.isnan(targets)
+        if not penalized.any():
+            continue
+        similarity[penalized] *= 1 - (np.abs(values[None, :] - targets[penalized, None]) / max_value)
+
+    return similarity
@@ -0,0 +1,116 @@
+from collections import deque
+from time import monotonic
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+class SourceHealth:
+    """
+    Latency and outcome statistics for one image source, with a circuit breaker.
+
+    A call fails when the scraper raises (HTTP errors such as blocks or rate
+    limits, bad responses) or times out; finding no images is a success.
+    After failure_threshold failures in a row the circuit opens and
+    the source is skipped for cooldown seconds; then a single probe call is
+    let through, which closes the circuit on success or reopens it.
+
+    The timeout for a call adapts to the source: timeout_multiplier times the
+    p95 latency of recent successful calls, clamped to [min_timeout,
+    max_timeout], or max_timeout until min_samples calls have succeeded.
+    """
+    def __init__(self, name, window=100, failure_threshold=5, cooldown=60, min_samples=10,
+                 min_timeout=2.0, max_timeout=60.0, timeout_multiplier=1.5):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+
+        self._latencies = deque(maxlen=window)  # Seconds, successful calls only
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = None  # monotonic() time the circuit stays open until
+        self._probing = False
+        self.counters = {'calls': 0, 'successes': 0, 'empty': 0, 'failures': 0, 'skipped': 0, 'circuit_opens': 0}
+
+    def allow_request(self):
+        """
+        Return whether the source may be queried now; counts skipped calls.
+        """
+        with self._lock:
+            if self.open_until is None:
+                return True
+            if monotonic() >= self.open_until and not self._probing:
+                # Half-open: let one probe through
+                self._probing = True
+                return True
+            self.counters['skipped'] += 1
+            return False
+
+    def timeout(self):
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.max_timeout
+            p95 = _percentile(sorted(self._latencies), 0.95)
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def record(self, latency, success, empty=False):
+        with self._lock:
+            self.counters['calls'] += 1
+            self._outcomes.append(success)
+            self._probing = False
+            if success:
+                self.counters['successes'] += 1
+                self.counters['empty'] += empty
+                self._latencies.append(latency)
+                self.consecutive_failures = 0
+                self.open_until = None
+                return
+
+            self.counters['failures'] += 1
+            self.consecutive_failures += 1
+            if self.open_until is not None or self.consecutive_failures >= self.failure_threshold:
+                self.open_until = monotonic() + self.cooldown
+                self.counters['circuit_opens'] += 1
+                logger.warning(f"Circuit opened for {self.name} after {self.consecutive_failures} failures")
+
+    def release_probe(self):
+        """
+        Give up a half-open probe that ended without an outcome (e.g. it was cancelled).
+        """
+        with self._lock:
+            self._probing = False
+
+    def success_rate(self):
+        with self._lock:
+            # Unknown sources start optimistic so they get tried
+            return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 1.0
+
+    def median_latency(self):
+        with self._lock:
+            return _percentile(sorted(self._latencies), 0.5) if self._latencies else 0.0
+
+    def rank_key(self):
+        """
+        Sort key putting the most successful, then fastest, sources first.
+        """
+        return (-self.success_rate(), self.median_latency())
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot = dict(self.counters)
+            snapshot['consecutive_failures'] = self.consecutive_failures
+            snapshot['circuit_open'] = self.open_until is not None
+            snapshot['p50_latency'] = _percentile(latencies, 0.5) if latencies else None
+            snapshot['p95_latency'] = _percentile(latencies, 0.95) if latencies else None
+        snapshot['success_rate'] = self.success_rate()
+        snapshot['timeout'] = self.timeout()
+        return snapshot
@@ -0,0 +1,188 @@
+"""
+Offline image backfill.
+
+Scrapes images for every recipe without dataset images and stores the
+results in the image cache that the request path reads, so that requests
+only reach the live scrapers for recipes added since the last backfill.
+
+Progress is checkpointed to <precomputed_dir>/image_backfill_checkpoint.json.
+Rerunning the job resumes where it stopped; --restart starts over. Recipes
+that already have an unexpired cache entry are skipped unless --refresh.
+
+Usage (from the backend directory):
+    python backfill_images.py [--concurrency 8] [--host-interval 1.0] [--limit N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from app.services.image_search import ImageSearchService
+from app.utils.data_loading import load_or_create_data
+from app.utils.http_client import HTTPClient
+from app.utils.image_cache import ImageCache
+from app.utils.request_scheduler import DEFAULT_HOST_LIMITS, PRIORITY_BACKGROUND
+from config import Config
+
+CHECKPOINT_FILE = 'image_backfill_checkpoint.json'
+DAY = 24 * 3600
+
+logger = logging.getLogger('backfill_images')
+
+def new_checkpoint():
+    # cursor: every pending recipe with a RecipeId <= cursor is done, except those in retry
+    return {'cursor': None, 'retry': [], 'counts': {'found': 0, 'empty': 0, 'skipped': 0}}
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return new_checkpoint()
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_checkpoint(path, checkpoint):
+    # Write to a temporary file and rename so an interrupted write never corrupts the checkpoint
+    with open(path + '.tmp', 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(path + '.tmp', path)
+
+def polite_host_limits(host_limits, host_interval):
+    """
+    Tighten every host's limits to one request per host_interval seconds, with no bursts.
+    A host_interval of 0 keeps the configured limits.
+
+    The job's scheduler is separate from the server's, so these limits are
+    all that keeps a backfill from competing with live requests for a host.
+    """
+    if not host_interval:
+        return host_limits
+    host_limits = dict({'default': {}}, **host_limits)
+    return {host: dict(limits, rate=min(limits.get('rate', DEFAULT_HOST_LIMITS['rate']), 1 / host_interval), burst=1)
+            for host, limits in host_limits.items()}
+
+def pending_rows(recipe_store, checkpoint, limit=None):
+    """
+    Rows to process, in RecipeId order: earlier incomplete ones first, then
+    those past the checkpoint cursor.
+    """
+    rows = [row for row in range(recipe_store.size) if not recipe_store.has_images[row]]
+    rows.sort(key=lambda row: recipe_store.recipe_ids[row])
+    retry = set(checkpoint['retry'])
+    cursor = checkpoint['cursor']
+    selected = ([row for row in rows if int(recipe_store.recipe_ids[row]) in retry] +
+                [row for row in rows if int(recipe_store.recipe_ids[row]) not in retry
+                 and (cursor is None or recipe_store.recipe_ids[row] > cursor)])
+    return selected[:limit] if limit else selected
+
+async def backfill(service, cache, recipe_store, rows, checkpoint, checkpoint_path, args):
+    counts = checkpoint['counts']
+    retry = set(checkpoint['retry'])
+    queue = iter(enumerate(rows))
+    finished = set()  # Positions in rows that are done
+    low_water = 0  # rows[:low_water] are all done
+    started = time.monotonic()
+
+    def advance_cursor():
+        nonlocal low_water
+        while low_water in finished:
+            recipe_id = int(recipe_store.recipe_ids[rows[low_water]])
+            if checkpoint['cursor'] is None or recipe_id > checkpoint['cursor']:
+                checkpoint['cursor'] = recipe_id
+            low_water += 1
+
+    def report():
+        done = len(finished)
+        rate = done / max(time.monotonic() - started, 1e-9)
+        eta = (len(rows) - done) / rate if rate else float('inf')
+        wait = service.http_client.stats()['wait']['background']
+        logger.info(f"{done}/{len(rows)} recipes ({rate:.1f}/s, ETA {eta / 60:.1f} min): "
+                    f"{counts['found']} found, {counts['empty']} empty, "
+                    f"{len(retry)} incomplete, {counts['skipped']} already cached; "
+                    f"p95 queue wait {wait['p95_wait'] or 0:.2f}s")
+
+    async def worker():
+        for position, row in queue:
+            recipe_id = int(recipe_store.recipe_ids[row])
+            name = recipe_store.names[row]
+
+            # A retried recipe stays in retry until its outcome is known, so an interrupted run keeps it
+            if not args.refresh and cache.has_entry(recipe_id, name):
+                counts['skipped'] += 1
+                retry.discard(recipe_id)
+            else:
+                try:
+                    urls, complete = await service.scrape_recipe_images(
+                        name, 3, recipe_id, time.monotonic() + args.timeout, PRIORITY_BACKGROUND
+                    )
+                except Exception as e:
+                    logger.error(f"Error scraping images for {name}: {str(e)}")
+                    urls, complete = [], False
+                if not complete:
+                    # Not cached; picked up first on the next run
+                    retry.add(recipe_id)
+                else:
+                    retry.discard(recipe_id)
+                    counts['found' if urls else 'empty'] += 1
+
+            finished.add(position)
+            advance_cursor()
+            if len(finished) % args.checkpoint_every == 0:
+                checkpoint['retry'] = sorted(retry)
+                save_checkpoint(checkpoint_path, checkpoint)
+                report()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    finally:
+        # Also reached on Ctrl-C, so a resumed run repeats at most the recipes in flight
+        checkpoint['retry'] = sorted(retry)
+        save_checkpoint(checkpoint_path, checkpoint)
+        report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape images for recipes without dataset images "
+                                                 "into the image cache.")
+    parser.add_argument('--csv', default=Config.CSV_FILE_PATH, help="recipe dataset CSV")
+    parser.add_argument('--precomputed-dir', default=Config.PRECOMPUTED_DIR)
+    parser.add_argument('--concurrency', type=int, default=8, help="recipes scraped at once")
+    parser.add_argument('--host-interval', type=float, default=1.0,
+                        help="minimum seconds between requests to the same host (0: configured limits)")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds allowed per recipe")
+    parser.add_argument('--ttl-days', type=float, default=180, help="lifetime of found images")
+    parser.add_argument('--negative-ttl-days', type=float, default=30,
+                        help="lifetime of 'no images found' entries")
+    parser.add_argument('--limit', type=int, default=None, help="process at most this many recipes")
+    parser.add_argument('--checkpoint-every', type=int, default=50)
+    parser.add_argument('--refresh', action='store_true', help="re-scrape recipes that are already cached")
+    parser.add_argument('--restart', action='store_true', help="ignore the existing checkpoint")
+    parser.add_argument('--verbose', action='store_true', help="show per-recipe scraper logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if not args.verbose:
+        logging.getLogger('app').setLevel(logging.WARNING)
+
+    data = load_or_create_data(args.csv, args.precomputed_dir)
+    recipe_store = data['recipe_store']
+    checkpoint_path = os.path.join(args.precomputed_dir, CHECKPOINT_FILE)
+    checkpoint = new_checkpoint() if args.restart else load_checkpoint(checkpoint_path)
+    rows = pending_rows(recipe_store, checkpoint, args.limit)
+    logger.info(f"{int((~recipe_store.has_images).sum())} recipes without dataset images, "
+                f"{len(rows)} to process")
+
+    cache = ImageCache(os.path.join(args.precomputed_dir, 'image_cache.sqlite'),
+                       ttl=args.ttl_days * DAY, negative_ttl=args.negative_ttl_days * DAY)
+    service = ImageSearchService(cache=cache, max_concurrency=args.concurrency,
+                                 http_client=HTTPClient(Config.HTTP_CONNECTOR_OPTIONS,
+                                                        polite_host_limits(Config.HTTP_HOST_LIMITS,
+                                                                           args.host_interval)))
+    try:
+        asyncio.run(backfill(service, cache, recipe_store, rows, checkpoint, checkpoint_path, args))
+    except KeyboardInterrupt:
+        logger.info("Interrupted; rerun to resume from the checkpoint")
+    finally:
+        service.close()
+        cache.close()
+
+if __name__ == '__main__':
+    main()
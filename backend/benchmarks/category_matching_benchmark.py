@@ -0,0 +1,71 @@
+"""
+Category matching benchmark.
+
+Checks CategoryMatcher (behind extraction.find_closest_category) against
+the expected results in benchmarks/fixtures/category_queries.json, which
+were recorded from the original per-call implementation kept below as
+find_closest_category_scan, and times both over the corpus.
+
+Usage (from the backend directory):
+    python -m benchmarks.category_matching_benchmark [repeats]
+"""
+import json
+import os
+import sys
+import time
+from difflib import SequenceMatcher, get_close_matches
+from app.services.extraction import RECIPE_CATEGORIES, find_closest_category
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'category_queries.json')
+
+def find_closest_category_scan(category):
+    """The original implementation, rescanning RECIPE_CATEGORIES on every call."""
+    if not category:
+        return ""
+
+    if category.lower() in [c.lower() for c in RECIPE_CATEGORIES]:
+        return next(c for c in RECIPE_CATEGORIES if c.lower() == category.lower())
+
+    category_parts = category.lower().split()
+    if len(category_parts) == 1 and category_parts[0] in [c.lower() for c in RECIPE_CATEGORIES]:
+        return next(c for c in RECIPE_CATEGORIES if c.lower() == category_parts[0])
+
+    for part in category_parts:
+        matches = [c for c in RECIPE_CATEGORIES if part in c.lower()]
+        if matches:
+            return matches[0]
+
+    matches = get_close_matches(category.lower(), [c.lower() for c in RECIPE_CATEGORIES], n=1, cutoff=0.75)
+    if matches:
+        closest_match = matches[0]
+        if SequenceMatcher(None, category.lower(), closest_match).ratio() > 0.8:
+            return next(c for c in RECIPE_CATEGORIES if c.lower() == closest_match)
+        else:
+            return ""
+
+    return ""
+
+def time_per_query(fn, queries, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (repeats * len(queries)) * 1e6
+
+def main(repeats=3):
+    with open(CORPUS_PATH, encoding='utf-8') as file:
+        corpus = json.load(file)
+    queries = [query for query, _ in corpus]
+
+    mismatches = [(query, expected, find_closest_category(query))
+                  for query, expected in corpus if find_closest_category(query) != expected]
+    for query, expected, found in mismatches[:10]:
+        print(f"MISMATCH {query!r}: expected {expected!r}, got {found!r}")
+    print(f"{len(corpus) - len(mismatches)}/{len(corpus)} queries match the recorded results")
+
+    before = time_per_query(find_closest_category_scan, queries, repeats)
+    after = time_per_query(find_closest_category, queries, repeats)
+    print(f"before {before:.1f} us/query, after {after:.1f} us/query ({before / after:.1f}x)")
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,52 @@
+"""
+Scraper page parsing benchmark.
+
+Times each scraper's BeautifulSoup parse (parse_images) against the
+targeted extraction (parse_images_fast) on the saved search-result pages
+in benchmarks/fixtures, and checks both find the same candidate URLs.
+
+Usage (from the backend directory):
+    python -m benchmarks.html_extraction_benchmark [repeats]
+"""
+import os
+import sys
+import time
+from app.utils.scrapers.allrecipes_scraper import AllRecipesScraper
+from app.utils.scrapers.food_network_scraper import FoodNetworkScraper
+from app.utils.scrapers.fooddotcom_scraper import FoodDotComScraper
+from app.utils.scrapers.google_scraper import GoogleScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+FIXTURES = [
+    (GoogleScraper, 'google_images.html'),
+    (AllRecipesScraper, 'allrecipes_search.html'),
+    (FoodNetworkScraper, 'foodnetwork_search.html'),
+    (FoodDotComScraper, 'fooddotcom_search.html'),
+]
+
+def time_per_parse(fn, html, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(html)
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main(repeats=10):
+    for scraper_class, fixture in FIXTURES:
+        with open(os.path.join(FIXTURES_DIR, fixture), encoding='utf-8') as file:
+            html = file.read()
+        scraper = scraper_class()
+
+        expected = scraper.parse_images(html)
+        found = scraper.parse_images_fast(html)
+        if found != expected:
+            print(f"{scraper_class.__name__}: MISMATCH, {len(found - expected)} extra, "
+                  f"{len(expected - found)} missing")
+
+        before = time_per_parse(scraper.parse_images, html, repeats)
+        after = time_per_parse(scraper.parse_images_fast, html, repeats)
+        print(f"{scraper_class.__name__} ({len(html) // 1024} KB, {len(expected)} candidates): "
+              f"before {before:.2f} ms/page, after {after:.2f} ms/page ({before / after:.1f}x)")
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,68 @@
+"""
+Per-query scoring benchmark.
+
+Compares an sklearn cosine_similarity call over the weighted, concatenated
+feature matrix against the block-decomposed scoring used by
+calculate_weighted_similarity.
+
+Usage (from the backend directory):
+    python -m benchmarks.scoring_benchmark [csv_file_path] [precomputed_dir]
+"""
+import sys
+import time
+from scipy.sparse import hstack
+from sklearn.metrics.pairwise import cosine_similarity
+from app.utils.data_loading import load_or_create_data
+from app.utils.feature_engineering import FEATURE_BLOCKS, RATING_WEIGHT, create_query_vector
+from app.utils.similarity_calculation import calculate_weighted_similarity
+from config import Config
+
+FEATURE_WEIGHTS = {
+    'ingredients': 0.15, 'category': 0.25, 'dietary': 0.20,
+    'calories': 0.10, 'time': 0.10, 'keywords': 0.10, 'keywords_name': 0.10
+}
+
+QUERIES = [
+    {'ingredients': ['chicken', 'garlic', 'salt'], 'category': 'chicken', 'calories': 400, 'time': 30},
+    {'ingredients': ['flour', 'sugar', 'eggs', 'butter'], 'keywords': ['dessert', 'baking']},
+    {'category': 'beverages', 'keywords_name': ['smoothie']},
+    {'ingredients': ['basil', 'tomato', 'clove'], 'time': 30, 'dietary_preference': 'is_vegetarian'},
+]
+
+def time_per_query(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def weighted_concatenation(blocks, feature_weights):
+    return hstack([
+        blocks[name] * feature_weights.get(name, RATING_WEIGHT if name == 'rating' else 0.0)
+        for name in FEATURE_BLOCKS
+    ]).tocsr()
+
+def main(csv_file_path=Config.CSV_FILE_PATH, precomputed_dir=Config.PRECOMPUTED_DIR, repeats=20):
+    data = load_or_create_data(csv_file_path, precomputed_dir)
+    block_matrices = data['block_matrices']
+    combined_matrix = weighted_concatenation(block_matrices, FEATURE_WEIGHTS)
+    print(f"{combined_matrix.shape[0]} recipes x {combined_matrix.shape[1]} features, "
+          f"{combined_matrix.nnz} nonzeros")
+
+    for query in QUERIES:
+        query_blocks = create_query_vector(
+            data['tfidf_vectorizer_ingredients'], data['tfidf_vectorizer_keywords'],
+            data['tfidf_vectorizer_keywords_name'], data['category_dummies'], data['scalers'], **query
+        )
+        empty_query = {name: block[:1] * 0 for name, block in block_matrices.items()}
+        query_vector = weighted_concatenation({**empty_query, **query_blocks}, FEATURE_WEIGHTS)
+        before = time_per_query(lambda: cosine_similarity(query_vector, combined_matrix), repeats)
+        after = time_per_query(
+            lambda: calculate_weighted_similarity(query_blocks, block_matrices, data['block_sq_norms'],
+                                                  FEATURE_WEIGHTS, data['recipe_store']),
+            repeats
+        )
+        print(f"{sorted(query)}: before {before:.2f} ms/query, after {after:.2f} ms/query "
+              f"({before / after:.1f}x)")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
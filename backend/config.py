@@ -3,4 +3,26 @@ import os
 class Config:
     CSV_FILE_PATH = os.path.join(os.path.dirname(__file__), 'recipe_dataset.csv')
     PRECOMPUTED_DIR = 'precomputed'
+    ANN_N_PROBE = 16  # IVF lists scanned per approximate-mode request
+    IMAGE_CACHE_TTL = 7 * 24 * 3600  # Seconds scraped image URLs stay cached
+    IMAGE_CACHE_NEGATIVE_TTL = 24 * 3600  # Seconds a "no images found" result stays cached
+    IMAGE_CACHE_LRU_SIZE = 4096
+    IMAGE_SEARCH_CONCURRENCY = 8  # Recipes scraped at once across all requests
+    EXTRACTION_CACHE_TTL = 30 * 24 * 3600  # Seconds a parsed LLM attribute extraction stays cached
+    EXTRACTION_CACHE_LRU_SIZE = 1024
+    EXTRACTION_FAST_PATH_MIN_CONFIDENCE = 0.85  # Simpler queries than this go to the LLM; above 1 disables
+    BATCH_MAX_QUERIES = 100  # Payloads accepted by /recommend/batch
+    BATCH_CHUNK_SIZE = 16  # Queries scored together; bounds the (queries x recipes) score matrices
+    REQUEST_DEADLINE = 10  # Seconds a request may spend on image scraping and LLM calls
+    # aiohttp.TCPConnector options for the shared scraper session
+    HTTP_CONNECTOR_OPTIONS = {'limit': 100, 'limit_per_host': 10, 'ttl_dns_cache': 300, 'keepalive_timeout': 30}
+    # Outbound limits per host: requests per second, burst size and requests in flight
+    HTTP_HOST_LIMITS = {
+        'default': {'rate': 10, 'burst': 10, 'max_concurrency': 6},
+        'www.google.com': {'rate': 2, 'burst': 4, 'max_concurrency': 3},
+        'www.allrecipes.com': {'rate': 3, 'burst': 6, 'max_concurrency': 4},
+        'www.foodnetwork.com': {'rate': 3, 'burst': 6, 'max_concurrency': 4},
+        'www.food.com': {'rate': 3, 'burst': 6, 'max_concurrency': 4},
+        'commons.wikimedia.org': {'rate': 5, 'burst': 10, 'max_concurrency': 4},
+    }
 
@@ -0,0 +1,93 @@
+"""
+BlockingCallPool behaviour behind extract_recipe_attributes_async, with a
+local stub in place of the Gemini model.
+"""
+import asyncio
+import json
+import threading
+import time
+from time import monotonic
+import pytest
+from app.services import extraction
+from app.utils.concurrency import BlockingCallPool
+
+MODEL_OUTPUT = json.dumps({"category": "", "calories": "", "time": "", "ingredients": ["basil"],
+                           "keywords": [], "keywords_name": []})
+
+class StubModel:
+    """generate_content that sleeps, counting calls and the most running at once."""
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            return type('Response', (), {'text': MODEL_OUTPUT})()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    def install(delay, max_workers):
+        model = StubModel(delay)
+        pool = BlockingCallPool(max_workers, name='test-llm')
+        monkeypatch.setattr(extraction, 'model', model)
+        monkeypatch.setattr(extraction, 'llm_calls', pool)
+        return model, pool
+    return install
+
+async def _extract_all(texts, deadline=None):
+    return await asyncio.gather(*(extraction.extract_recipe_attributes_async(text, deadline) for text in texts))
+
+def test_identical_prompts_share_one_call(stub_llm):
+    model, pool = stub_llm(delay=0.2, max_workers=4)
+
+    # Same text up to normalization, so all eight share a key
+    results = asyncio.run(_extract_all(["basil pasta"] * 4 + ["Basil  pasta!"] * 4))
+
+    assert model.calls == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["ingredients"] == ["basil"]
+    assert pool.stats()['coalesced'] == 7
+
+def test_in_flight_calls_stay_under_the_cap(stub_llm):
+    model, pool = stub_llm(delay=0.1, max_workers=2)
+
+    results = asyncio.run(_extract_all([f"recipe number {index}" for index in range(6)]))
+
+    assert model.calls == 6
+    assert model.max_running == 2
+    assert all("error" not in result for result in results)
+    assert pool.stats()['in_flight'] == 0
+
+def test_expired_deadline_times_out_without_calling(stub_llm):
+    model, pool = stub_llm(delay=0.1, max_workers=1)
+
+    result = asyncio.run(extraction.extract_recipe_attributes_async("basil pasta", monotonic() - 1))
+
+    assert result == {"error": "Attribute extraction timed out"}
+    assert model.calls == 0
+    stats = pool.stats()
+    assert (stats['timeouts'], stats['running'], stats['in_flight']) == (1, 0, 0)
+
+def test_deadline_passing_mid_call_frees_the_slot(stub_llm):
+    model, pool = stub_llm(delay=0.3, max_workers=1)
+
+    result = asyncio.run(extraction.extract_recipe_attributes_async("basil pasta", monotonic() + 0.05))
+    assert result == {"error": "Attribute extraction timed out"}
+
+    # The abandoned call finishes in the background and gives its worker back
+    time.sleep(0.4)
+    stats = pool.stats()
+    assert (stats['running'], stats['in_flight']) == (0, 0)
+    assert "error" not in asyncio.run(extraction.extract_recipe_attributes_async("tomato soup", monotonic() + 5))
+    assert model.calls == 2